@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -80,6 +81,21 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # WAL lets status reads proceed while the write-behind flusher
+            # commits; NORMAL sync is durable across process crashes in WAL mode.
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA temp_store=MEMORY;'
+                'PRAGMA cache_size=-20000;'
+                'PRAGMA mmap_size=134217728;'
+                'PRAGMA wal_autocheckpoint=1000;'
+            ),
+            # Take the write lock up front instead of failing on upgrade.
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 5,
+        },
     }
 }
 
@@ -134,3 +150,104 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 CORS_ALLOW_ALL_ORIGINS = True 
+
+
+# Relayer
+
+# Write-behind persistence for RelayedTransaction. Events are flushed once
+# MAX_BATCH are pending or the oldest has waited MAX_DELAY seconds; callers
+# flush inline when MAX_PENDING is reached so the in-memory backlog is bounded.
+RELAYER_WRITE_BEHIND = {
+    'MAX_BATCH': int(os.getenv('WRITE_BEHIND_MAX_BATCH', 200)),
+    'MAX_DELAY': float(os.getenv('WRITE_BEHIND_MAX_DELAY', 0.5)),
+    'MAX_PENDING': int(os.getenv('WRITE_BEHIND_MAX_PENDING', 5000)),
+}
+
+# Status responses. Finalized statuses are cached indefinitely (in-process LRU,
+# plus the named Django cache if BACKEND is set); others for PENDING_TTL seconds.
+RELAYER_STATUS_CACHE = {
+    'MAX_ENTRIES': int(os.getenv('STATUS_CACHE_MAX_ENTRIES', 10000)),
+    'PENDING_TTL': float(os.getenv('STATUS_CACHE_PENDING_TTL', 2)),
+    'BACKEND': os.getenv('STATUS_CACHE_BACKEND') or None,
+}
+
+# Sponsorship policy (see policy.example.json). The file is re-read when it
+# changes; without one every request is sponsored.
+RELAYER_POLICY = {
+    'FILE': os.getenv('RELAYER_POLICY_FILE') or None,
+    'CHECK_INTERVAL': float(os.getenv('RELAYER_POLICY_CHECK_INTERVAL', 1)),
+}
+
+# Gas spend ledger. Spend is aggregated in memory into BUCKET_SECONDS buckets
+# per sponsor and written every FLUSH_INTERVAL seconds. Daily budgets are set
+# in the policy file. Every SWEEP_INTERVAL seconds a node bills transactions
+# sent with its keys whose receipts no node has booked yet.
+RELAYER_LEDGER = {
+    'BUCKET_SECONDS': int(os.getenv('LEDGER_BUCKET_SECONDS', 3600)),
+    'FLUSH_INTERVAL': float(os.getenv('LEDGER_FLUSH_INTERVAL', 10)),
+    'SWEEP_INTERVAL': float(os.getenv('LEDGER_SWEEP_INTERVAL', 60)),
+}
+
+# Admission control on pending (broadcast, unconfirmed) transactions. Each
+# relayer key starts at INITIAL_LIMIT; the limit grows while confirmations
+# arrive within TARGET_LATENCY seconds and is multiplied by DECREASE when they
+# don't. Requests over the limit get 429 with Retry-After. The sending node
+# checks receipts of its own transactions every RECEIPT_POLL_INTERVAL seconds.
+RELAYER_ADMISSION = {
+    'INITIAL_LIMIT': int(os.getenv('ADMISSION_INITIAL_LIMIT', 16)),
+    'MIN_LIMIT': int(os.getenv('ADMISSION_MIN_LIMIT', 2)),
+    'MAX_LIMIT': int(os.getenv('ADMISSION_MAX_LIMIT', 256)),
+    'GLOBAL_LIMIT': int(os.getenv('ADMISSION_GLOBAL_LIMIT', 512)),
+    'TARGET_LATENCY': float(os.getenv('ADMISSION_TARGET_LATENCY', 30)),
+    'DECREASE': float(os.getenv('ADMISSION_DECREASE', 0.5)),
+    'INFLIGHT_TIMEOUT': float(os.getenv('ADMISSION_INFLIGHT_TIMEOUT', 600)),
+    'RECEIPT_POLL_INTERVAL': float(os.getenv('ADMISSION_RECEIPT_POLL_INTERVAL', 2)),
+}
+
+# Relay scheduling. TIERS maps each priority tier, highest first, to the number
+# of dispatch workers reserved for it; policy rules pick a tier with "tier".
+# Within a tier the earliest deadline goes first. Each tier may fill HEADROOM
+# less of the admission limits than the one above it, so urgent relays find
+# free slots while bulk traffic is backed up. RelayView waits up to
+# WAIT_TIMEOUT seconds for its request to be sent before answering 429.
+RELAYER_SCHEDULER = {
+    'TIERS': {
+        'priority': int(os.getenv('SCHEDULER_PRIORITY_WORKERS', 2)),
+        'standard': int(os.getenv('SCHEDULER_STANDARD_WORKERS', 2)),
+        'bulk': int(os.getenv('SCHEDULER_BULK_WORKERS', 1)),
+    },
+    'DEFAULT_TIER': 'standard',
+    'QUEUE_LIMIT': int(os.getenv('SCHEDULER_QUEUE_LIMIT', 1000)),
+    'HEADROOM': float(os.getenv('SCHEDULER_HEADROOM', 0.25)),
+    'WAIT_TIMEOUT': float(os.getenv('SCHEDULER_WAIT_TIMEOUT', 30)),
+}
+
+# Running several backend instances. Each node leases up to KEYS_PER_NODE of
+# the keys in RELAYER_PRIVATE_KEYS for KEY_LEASE_TTL seconds at a time and only
+# sends with those. With HANDOFF on, relays a node can't send within
+# WAIT_TIMEOUT are queued in the database (202 with a requestId) and claimed,
+# CLAIM_BATCH at a time with WORK_LEASE_TTL second leases, by any node with room.
+RELAYER_CLUSTER = {
+    'NODE_ID': os.getenv('RELAYER_NODE_ID') or None,
+    'KEYS_PER_NODE': int(os.getenv('CLUSTER_KEYS_PER_NODE', 1)),
+    'KEY_LEASE_TTL': float(os.getenv('CLUSTER_KEY_LEASE_TTL', 30)),
+    'HANDOFF': os.getenv('CLUSTER_HANDOFF', '').lower() in ('1', 'true', 'yes'),
+    'WORK_LEASE_TTL': float(os.getenv('CLUSTER_WORK_LEASE_TTL', 60)),
+    'CLAIM_BATCH': int(os.getenv('CLUSTER_CLAIM_BATCH', 20)),
+    'POLL_INTERVAL': float(os.getenv('CLUSTER_POLL_INTERVAL', 1)),
+}
+
+# Traffic capture for `manage.py replay_traffic`. When PATH is set, the relay,
+# nonce and status endpoints append one JSON line per request (a SAMPLE
+# fraction of them). RESIGN replaces senders with pseudonyms derived with SALT
+# and drops signatures, so the replay signs with deterministic test keys.
+RELAYER_CAPTURE = {
+    'PATH': os.getenv('CAPTURE_PATH') or None,
+    'RESIGN': os.getenv('CAPTURE_RESIGN', '').lower() in ('1', 'true', 'yes'),
+    'SALT': os.getenv('CAPTURE_SALT', ''),
+    'SAMPLE': float(os.getenv('CAPTURE_SAMPLE', 1)),
+}
+
+# Finalized transactions older than this are moved to the archive table by
+# `manage.py compact_transactions`.
+RELAYER_RETENTION_DAYS = int(os.getenv('RELAYER_RETENTION_DAYS', 30))
@@ -0,0 +1,182 @@
+import math
+import threading
+import time
+
+from django.conf import settings
+
+
+class _KeyState:
+    __slots__ = ('limit', 'reserved', 'inflight', 'last_decrease')
+
+    def __init__(self, limit: float):
+        self.limit = limit
+        self.reserved = 0    # slots taken by sends that have no tx hash yet
+        self.inflight = {}   # tx_hash -> submitted at (monotonic)
+        self.last_decrease = 0.0
+
+    def count(self) -> int:
+        return self.reserved + len(self.inflight)
+
+
+class AdmissionController:
+    """
+    Caps pending (sent but unconfirmed) transactions per relayer key and
+    overall.
+
+    Each key's limit adapts AIMD-style: every confirmation that lands within
+    `target_latency` seconds grows the limit by 1/limit (about +1 per full
+    window), and a slow confirmation or one that never shows up within
+    `inflight_timeout` cuts it by `decrease`, at most once per
+    `target_latency` so a single backlog is not punished repeatedly.
+    """
+
+    def __init__(self, initial_limit: int = 16, min_limit: int = 2, max_limit: int = 256,
+                 global_limit: int = 512, target_latency: float = 30, decrease: float = 0.5,
+                 inflight_timeout: float = 600):
+        self.initial_limit = initial_limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.global_limit = global_limit
+        self.target_latency = target_latency
+        self.decrease = decrease
+        self.inflight_timeout = inflight_timeout
+
+        self._lock = threading.Lock()
+        self._keys = {}     # relayer address -> _KeyState
+        self._owners = {}   # tx_hash -> relayer address
+        self._latency = target_latency / 2  # EWMA of inclusion latency in seconds
+        self._total = 0
+
+    @classmethod
+    def from_settings(cls):
+        config = getattr(settings, 'RELAYER_ADMISSION', {})
+        return cls(
+            initial_limit=config.get('INITIAL_LIMIT', 16),
+            min_limit=config.get('MIN_LIMIT', 2),
+            max_limit=config.get('MAX_LIMIT', 256),
+            global_limit=config.get('GLOBAL_LIMIT', 512),
+            target_latency=config.get('TARGET_LATENCY', 30),
+            decrease=config.get('DECREASE', 0.5),
+            inflight_timeout=config.get('INFLIGHT_TIMEOUT', 600),
+        )
+
+    def try_acquire(self, relayer: str, share: float = 1.0):
+        """
+        Reserve a slot for one send. Returns (True, 0) on success, otherwise
+        (False, seconds the caller should wait before retrying). Every
+        successful call must be followed by submitted() or release().
+
+        With `share` below 1 the caller may only fill that fraction of the
+        key's and the global limit, keeping the rest for callers with a
+        larger share.
+        """
+        now = time.monotonic()
+        with self._lock:
+            state = self._state(relayer)
+            self._expire(state, now)
+            if (state.count() >= max(1, int(state.limit * share))
+                    or self._total >= max(1, int(self.global_limit * share))):
+                return False, self._retry_after(state)
+            state.reserved += 1
+            self._total += 1
+            return True, 0
+
+    def acquire_any(self, relayers: list, share: float = 1.0):
+        """
+        try_acquire() on each relayer in turn. Returns (relayer, 0) for the
+        first with a free slot, else (None, shortest retry-after).
+        """
+        retry_after = None
+        for relayer in relayers:
+            admitted, wait = self.try_acquire(relayer, share)
+            if admitted:
+                return relayer, 0
+            retry_after = wait if retry_after is None else min(retry_after, wait)
+        return None, retry_after or 1
+
+    def submitted(self, relayer: str, tx_hash: str):
+        with self._lock:
+            state = self._state(relayer)
+            state.reserved -= 1
+            state.inflight[tx_hash] = time.monotonic()
+            self._owners[tx_hash] = relayer
+
+    def release(self, relayer: str):
+        """Give back a reserved slot whose send failed."""
+        with self._lock:
+            self._state(relayer).reserved -= 1
+            self._total -= 1
+
+    def confirmed(self, tx_hash: str):
+        now = time.monotonic()
+        with self._lock:
+            relayer = self._owners.pop(tx_hash, None)
+            if relayer is None:
+                return
+            state = self._keys[relayer]
+            submitted_at = state.inflight.pop(tx_hash)
+            self._total -= 1
+
+            latency = now - submitted_at
+            self._latency += 0.2 * (latency - self._latency)
+            if latency <= self.target_latency:
+                state.limit = min(self.max_limit, state.limit + 1 / state.limit)
+            else:
+                self._back_off(state, now)
+
+    def retry_after(self, relayers: list) -> int:
+        with self._lock:
+            return min((self._retry_after(self._state(relayer)) for relayer in relayers), default=1)
+
+    def latency(self) -> float:
+        """Smoothed seconds from broadcast to inclusion."""
+        return self._latency
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'inflight': self._total,
+                'globalLimit': self.global_limit,
+                'latency': round(self._latency, 2),
+                'keys': {
+                    relayer: {'inflight': state.count(), 'limit': int(state.limit)}
+                    for relayer, state in self._keys.items()
+                },
+            }
+
+    def _state(self, relayer: str) -> _KeyState:
+        # Caller holds self._lock
+        state = self._keys.get(relayer)
+        if state is None:
+            state = self._keys[relayer] = _KeyState(float(self.initial_limit))
+        return state
+
+    def _expire(self, state: _KeyState, now: float):
+        # Caller holds self._lock. Transactions the receipt watcher never saw
+        # mined are assumed stuck or dropped; either way they count as congestion.
+        stale = []
+        for tx_hash, submitted_at in state.inflight.items():
+            # Insertion order is submission order, so stop at the first fresh one
+            if now - submitted_at <= self.inflight_timeout:
+                break
+            stale.append(tx_hash)
+        for tx_hash in stale:
+            del state.inflight[tx_hash]
+            self._owners.pop(tx_hash, None)
+            self._total -= 1
+        if stale:
+            self._back_off(state, now)
+
+    def _back_off(self, state: _KeyState, now: float):
+        # Caller holds self._lock
+        if now - state.last_decrease >= self.target_latency:
+            state.limit = max(self.min_limit, state.limit * self.decrease)
+            state.last_decrease = now
+
+    def _retry_after(self, state: _KeyState) -> int:
+        # Roughly how long until one pending transaction clears
+        pending = max(1, state.count())
+        return max(1, math.ceil(self._latency / pending))
+
+
+admission = AdmissionController.from_settings()
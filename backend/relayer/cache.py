@@ -0,0 +1,108 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+
+# A finalized status never changes, so it may be cached for as long as we like
+FINAL_MAX_AGE = 365 * 24 * 60 * 60
+
+
+class StatusCache:
+    """
+    In-process LRU of status response bodies keyed by tx hash.
+
+    Finalized entries never expire; others live for `pending_ttl` seconds so
+    bursts of polls for the same transaction share one receipt lookup. When
+    `backend` names a Django cache, finalized entries are also written there
+    so other workers can skip the DB and RPC as well.
+    """
+
+    def __init__(self, max_entries: int = 10000, pending_ttl: float = 2, backend: str = None):
+        self.max_entries = max_entries
+        self.pending_ttl = pending_ttl
+        self.backend = backend
+        self._entries = OrderedDict()  # tx_hash -> (body, etag, expires_at or None)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        config = getattr(settings, 'RELAYER_STATUS_CACHE', {})
+        return cls(
+            max_entries=config.get('MAX_ENTRIES', 10000),
+            pending_ttl=config.get('PENDING_TTL', 2),
+            backend=config.get('BACKEND'),
+        )
+
+    def get(self, tx_hash: str):
+        """Return (body, etag, final) or None."""
+        with self._lock:
+            entry = self._entries.get(tx_hash)
+            if entry is not None:
+                body, etag, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._entries.move_to_end(tx_hash)
+                    return body, etag, expires_at is None
+                del self._entries[tx_hash]
+
+        if self.backend:
+            shared = caches[self.backend].get(self._key(tx_hash))
+            if shared is not None:
+                body, etag = shared
+                self._store(tx_hash, body, etag, None)
+                return body, etag, True
+        return None
+
+    def set(self, tx_hash: str, body: dict, final: bool) -> str:
+        etag = make_etag(body)
+        expires_at = None if final else time.monotonic() + self.pending_ttl
+        self._store(tx_hash, body, etag, expires_at)
+        if final and self.backend:
+            caches[self.backend].set(self._key(tx_hash), (body, etag), FINAL_MAX_AGE)
+        return etag
+
+    def _store(self, tx_hash: str, body: dict, etag: str, expires_at):
+        with self._lock:
+            self._entries[tx_hash] = (body, etag, expires_at)
+            self._entries.move_to_end(tx_hash)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _key(self, tx_hash: str) -> str:
+        return f"relayer:status:{tx_hash.lower()}"
+
+
+def make_etag(body: dict) -> str:
+    payload = json.dumps(body, sort_keys=True, cls=DjangoJSONEncoder).encode()
+    return quote_etag(hashlib.sha256(payload).hexdigest()[:32])
+
+
+def cached_response(request, body: dict, etag: str, final: bool, pending_ttl: float) -> Response:
+    """
+    Build a response carrying ETag and Cache-Control, or a bodiless 304 if
+    the client already holds this representation.
+    """
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match and (if_none_match.strip() == '*' or etag in parse_etags(if_none_match)):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = Response(body)
+
+    response['ETag'] = etag
+    if final:
+        patch_cache_control(response, public=True, max_age=FINAL_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=int(pending_ttl), must_revalidate=True)
+    return response
+
+
+status_cache = StatusCache.from_settings()
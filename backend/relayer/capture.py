@@ -0,0 +1,160 @@
+import atexit
+import json
+import random
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from eth_account import Account
+from eth_utils import keccak
+
+TRACE_VERSION = 1
+
+
+def pseudonym(address: str, salt: str) -> str:
+    """Stable stand-in for a sender, so traces keep the sender distribution but not the addresses."""
+    return keccak(f"{salt}:{address.lower()}".encode()).hex()[:16]
+
+
+def test_account(pseudonym: str):
+    """The deterministic test key replays sign a pseudonymous sender's requests with."""
+    return Account.from_key(keccak(f"relayer-replay:{pseudonym}".encode()))
+
+
+class TrafficRecorder:
+    """
+    Appends one compact JSON line per request to `path`, for replaying
+    with `manage.py replay_traffic`.
+
+    Views only queue a few references; formatting and writing happen on a
+    background thread every `flush_interval` seconds. With `resign` on,
+    senders are replaced by salted pseudonyms and signatures are dropped;
+    the replay signs again with a test key per pseudonym, with deadlines
+    stored relative to the request time so they stay valid at replay.
+    """
+
+    def __init__(self, path: str, resign: bool = False, salt: str = '', sample: float = 1.0,
+                 flush_interval: float = 1):
+        self.path = path
+        self.resign = resign
+        self.salt = salt
+        self.sample = sample
+        self.flush_interval = flush_interval
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = []
+        self._thread = None
+
+    @classmethod
+    def from_settings(cls):
+        config = getattr(settings, 'RELAYER_CAPTURE', {})
+        if not config.get('PATH'):
+            return None
+        return cls(
+            path=config['PATH'],
+            resign=config.get('RESIGN', False),
+            salt=config.get('SALT', ''),
+            sample=config.get('SAMPLE', 1.0),
+        )
+
+    def record(self, endpoint: str, started: float, duration: float, response, fields: dict):
+        if self.sample < 1 and random.random() >= self.sample:
+            return
+        with self._lock:
+            data = getattr(response, 'data', None)
+            self._pending.append((endpoint, started, duration, response.status_code, fields, data))
+            self._ensure_started()
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+            if not pending:
+                return 0
+            lines = []
+            for entry in pending:
+                try:
+                    lines.append(json.dumps(self._format(*entry), separators=(',', ':')))
+                except Exception as e:
+                    print("Dropping unrecordable request:", e)
+            with open(self.path, 'a') as trace:
+                trace.write(''.join(line + '\n' for line in lines))
+            return len(lines)
+
+    def _format(self, endpoint: str, started: float, duration: float, code: int, fields: dict, data) -> dict:
+        line = {'v': TRACE_VERSION, 'e': endpoint, 't': round(started, 3), 'ms': round(duration * 1000, 2), 'c': code}
+        if endpoint == 'relay':
+            payload = fields.get('payload')
+            if not isinstance(payload, dict) or not isinstance(payload.get('request'), dict):
+                return line
+            request = dict(payload['request'])
+            if self.resign:
+                line['k'] = pseudonym(str(request.pop('from', '')), self.salt)
+                try:
+                    request['dl'] = int(request.pop('deadline')) - int(started)
+                except (KeyError, TypeError, ValueError):
+                    pass
+            else:
+                line['s'] = payload.get('signature')
+            line['r'] = request
+            if isinstance(data, dict):
+                line['tx'] = data.get('txHash') or data.get('requestId')
+        elif endpoint == 'nonce':
+            address = fields.get('address') or ''
+            if self.resign:
+                line['k'] = pseudonym(address, self.salt)
+            else:
+                line['a'] = address
+        elif endpoint == 'status':
+            line['ref'] = fields.get('tx_hash')
+            if fields.get('conditional'):
+                line['inm'] = 1
+        return line
+
+    def _ensure_started(self):
+        # Caller holds self._lock
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='relayer-capture', daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print("Traffic capture write failed:", e)
+
+
+recorder = TrafficRecorder.from_settings()
+
+
+def captured(endpoint: str):
+    """Record calls to a view method while RELAYER_CAPTURE['PATH'] is set."""
+    def decorate(method):
+        if recorder is None:
+            return method
+
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            started = time.time()
+            clock = time.perf_counter()
+            response = method(view, request, *args, **kwargs)
+            duration = time.perf_counter() - clock
+            if endpoint == 'relay':
+                try:
+                    # Already parsed by the view, so this is a cached attribute
+                    fields = {'payload': request.data}
+                except Exception:
+                    fields = {}
+            elif endpoint == 'nonce':
+                fields = {'address': request.query_params.get('address')}
+            else:
+                fields = {'tx_hash': kwargs.get('tx_hash'), 'conditional': 'HTTP_IF_NONE_MATCH' in request.META}
+            recorder.record(endpoint, started, duration, response, fields)
+            return response
+        return wrapper
+    return decorate
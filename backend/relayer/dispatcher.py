@@ -0,0 +1,119 @@
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .admission import admission
+from .forward_request import ForwardRequest, InvalidForwardRequest, parse_signature
+from .leasing import LeaseLost, WorkQueue
+
+
+class QueueDispatcher:
+    """
+    Sends relays other nodes handed off to the shared queue (see
+    leasing.WorkQueue) whenever this node has spare admission capacity on
+    the relayer keys it holds, and settles rows left 'sending' by nodes
+    that died mid-send.
+    """
+
+    def __init__(self, service, queue: WorkQueue, receipts, batch_size: int = 20, poll_interval: float = 1,
+                 share: float = 1.0):
+        self.service = service
+        self.queue = queue
+        self.receipts = receipts
+        self.share = share  # of the admission limits; see AdmissionController.try_acquire
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+
+        self._lock = threading.Lock()
+        self._thread = None
+        self._sent = 0
+
+    @classmethod
+    def from_settings(cls, service, receipts, share: float = 1.0):
+        config = getattr(settings, 'RELAYER_CLUSTER', {})
+        return cls(
+            service=service,
+            queue=WorkQueue(service.key_leases.node_id, ttl=config.get('WORK_LEASE_TTL', 60)),
+            receipts=receipts,
+            batch_size=config.get('CLAIM_BATCH', 20),
+            poll_interval=config.get('POLL_INTERVAL', 1),
+            share=share,
+        )
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='relayer-queue-dispatcher', daemon=True)
+                self._thread.start()
+
+    def stats(self) -> dict:
+        return {'sent': self._sent}
+
+    def dispatch_once(self) -> int:
+        """Claim and send one batch. Returns how many rows were claimed."""
+        for row in self.queue.abandoned():
+            self.queue.recover(row, self.service.is_broadcast(row.tx_hash))
+
+        if not self.service.key_leases.held():
+            return 0
+        rows = self.queue.claim(self.batch_size)
+        for i, row in enumerate(rows):
+            if not self._send(row):
+                # Out of capacity; let another node have the rest
+                for rest in rows[i:]:
+                    self.queue.release(rest)
+                break
+            self.queue.heartbeat(rows[i + 1:])
+        return len(rows)
+
+    def _send(self, row) -> bool:
+        try:
+            forward_request = ForwardRequest.parse(row.payload['request'])
+            signature = parse_signature(row.payload['signature'])
+        except (InvalidForwardRequest, KeyError, TypeError) as e:
+            print(f"Dropping unreadable queued relay {row.request_id}:", e)
+            self.queue.finish(row, 'failed')
+            return True
+        if forward_request.expired(time.time()):
+            self.queue.finish(row, 'failed')
+            return True
+
+        relayer, _ = admission.acquire_any(self.service.key_leases.held(), self.share)
+        if relayer is None:
+            return False
+
+        def before_send(tx_hash, nonce):
+            if not self.queue.mark_sending(row, tx_hash, relayer, nonce):
+                raise LeaseLost(f"Lost the lease on queued relay {row.request_id}")
+
+        try:
+            sent = self.service.relay_transaction(forward_request, signature, relayer, before_send)
+        except LeaseLost:
+            admission.release(relayer)
+            self.queue.release(row)
+            return True
+        except Exception as e:
+            admission.release(relayer)
+            print(f"Queued relay {row.request_id} failed:", e)
+            self.queue.finish(row, 'failed')
+            return True
+
+        admission.submitted(relayer, sent.tx_hash)
+        self.receipts.watch(sent.tx_hash, row.sponsor or row.to_address.lower())
+        self.queue.finish(row, 'submitted')
+        self._sent += 1
+        return True
+
+    def _run(self):
+        while True:
+            try:
+                claimed = self.dispatch_once()
+            except Exception as e:
+                print("Queue dispatch failed:", e)
+                claimed = 0
+            finally:
+                close_old_connections()
+            if claimed < self.batch_size:
+                time.sleep(self.poll_interval)
@@ -0,0 +1,202 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from eth_abi import decode
+from eth_account import Account
+from eth_account._utils.legacy_transactions import Transaction
+from eth_account.typed_transactions import TypedTransaction
+from eth_utils import keccak, to_checksum_address
+from hexbytes import HexBytes
+
+EXECUTE_SELECTOR = keccak(text='execute((address,address,uint256,uint256,uint256,uint48,bytes),bytes)')[:4]
+NONCES_SELECTOR = keccak(text='nonces(address)')[:4]
+
+
+class FakeNode:
+    """
+    Just enough of an Ethereum JSON-RPC node to run the relayer against,
+    for load tests and traffic replays.
+
+    Raw transactions are accepted without checking balances or nonces and
+    are "mined" `block_time` seconds later. Outcomes are a function of the
+    tx hash (`revert_rate` of them fail), and gas used is a function of the
+    calldata size, so a replay yields the same results every run.
+    """
+
+    def __init__(self, chain_id: int, block_time: float = 2, revert_rate: float = 0):
+        self.chain_id = chain_id
+        self.block_time = block_time
+        self.revert_rate = revert_rate
+
+        self._lock = threading.Lock()
+        self._started = time.time()
+        self._txs = {}          # tx hash -> (transaction dict, sent at)
+        self._counts = {}       # sender -> next account nonce
+        self._forwarded = {}    # forwarder -> {request sender -> executed requests}
+
+    def handle(self, payload):
+        if isinstance(payload, list):
+            return [self.handle(call) for call in payload]
+        method = getattr(self, '_' + str(payload.get('method')), None)
+        if method is None:
+            error = {'code': -32601, 'message': f"method {payload.get('method')} not supported"}
+        else:
+            try:
+                return {'jsonrpc': '2.0', 'id': payload.get('id'), 'result': method(*payload.get('params', []))}
+            except Exception as e:
+                error = {'code': -32000, 'message': str(e)}
+        return {'jsonrpc': '2.0', 'id': payload.get('id'), 'error': error}
+
+    def _web3_clientVersion(self):
+        return 'relayer-fake-node/1'
+
+    def _net_version(self):
+        return str(self.chain_id)
+
+    def _eth_chainId(self):
+        return hex(self.chain_id)
+
+    def _eth_blockNumber(self):
+        return hex(self._block(time.time()))
+
+    def _eth_gasPrice(self):
+        return hex(10 ** 9)
+
+    def _eth_maxPriorityFeePerGas(self):
+        return hex(10 ** 9)
+
+    def _eth_getTransactionCount(self, address, block='latest'):
+        with self._lock:
+            return hex(self._counts.get(address.lower(), 0))
+
+    def _eth_sendRawTransaction(self, raw):
+        raw = HexBytes(raw)
+        sender = Account.recover_transaction(raw).lower()
+        decoded = _decode_transaction(raw)
+        tx_hash = '0x' + keccak(raw).hex()
+        with self._lock:
+            self._counts[sender] = max(self._counts.get(sender, 0), decoded['nonce'] + 1)
+            self._txs[tx_hash] = (dict(decoded, sender=sender), time.time())
+        return tx_hash
+
+    def _eth_getTransactionByHash(self, tx_hash):
+        with self._lock:
+            entry = self._txs.get(tx_hash.lower())
+        if entry is None:
+            return None
+        tx, sent_at = entry
+        mined = self._mined(sent_at)
+        return {
+            'hash': tx_hash,
+            'from': to_checksum_address(tx['sender']),
+            'to': tx['to'],
+            'nonce': hex(tx['nonce']),
+            'input': '0x' + tx['data'].hex(),
+            'value': hex(tx['value']),
+            'gas': hex(tx['gas']),
+            'gasPrice': hex(10 ** 9),
+            'type': '0x2',
+            'chainId': hex(self.chain_id),
+            'blockHash': self._block_hash(sent_at) if mined else None,
+            'blockNumber': hex(self._block(sent_at + self.block_time)) if mined else None,
+            'transactionIndex': '0x0' if mined else None,
+        }
+
+    def _eth_getTransactionReceipt(self, tx_hash):
+        with self._lock:
+            entry = self._txs.get(tx_hash.lower())
+        if entry is None or not self._mined(entry[1]):
+            return None
+        tx, sent_at = entry
+        status = int.from_bytes(keccak(hexstr=tx_hash)[:4], 'big') >= self.revert_rate * 2 ** 32
+        if status:
+            self._executed(tx)
+        return {
+            'transactionHash': tx_hash,
+            'transactionIndex': '0x0',
+            'blockHash': self._block_hash(sent_at),
+            'blockNumber': hex(self._block(sent_at + self.block_time)),
+            'from': to_checksum_address(tx['sender']),
+            'to': tx['to'],
+            'cumulativeGasUsed': hex(_gas_used(tx['data'])),
+            'gasUsed': hex(_gas_used(tx['data'])),
+            'effectiveGasPrice': hex(10 ** 9),
+            'contractAddress': None,
+            'logs': [],
+            'logsBloom': '0x' + '00' * 256,
+            'status': '0x1' if status else '0x0',
+            'type': '0x2',
+        }
+
+    def _eth_call(self, call, block='latest'):
+        data = HexBytes(call.get('data') or call.get('input') or '0x')
+        if data[:4] != NONCES_SELECTOR:
+            raise ValueError("only nonces(address) calls are supported")
+        owner = decode(['address'], data[4:])[0].lower()
+        with self._lock:
+            executed = self._forwarded.get((call.get('to') or '').lower(), {}).get(owner, 0)
+        return '0x' + executed.to_bytes(32, 'big').hex()
+
+    def _executed(self, tx):
+        # Count each successful execute() once per forwarder request sender
+        if tx['data'][:4] != EXECUTE_SELECTOR or tx.get('counted'):
+            return
+        request, _ = decode(['(address,address,uint256,uint256,uint256,uint48,bytes)', 'bytes'], tx['data'][4:])
+        with self._lock:
+            if tx.get('counted'):
+                return
+            tx['counted'] = True
+            senders = self._forwarded.setdefault((tx['to'] or '').lower(), {})
+            senders[request[0].lower()] = senders.get(request[0].lower(), 0) + 1
+
+    def _mined(self, sent_at: float) -> bool:
+        return time.time() - sent_at >= self.block_time
+
+    def _block(self, at: float) -> int:
+        return 1 + int((at - self._started) / max(self.block_time, 0.001))
+
+    def _block_hash(self, sent_at: float) -> str:
+        return '0x' + keccak(self._block(sent_at + self.block_time).to_bytes(8, 'big')).hex()
+
+
+def _decode_transaction(raw: HexBytes) -> dict:
+    if raw[0] < 0x7f:
+        fields = TypedTransaction.from_bytes(raw).as_dict()
+    else:
+        fields = Transaction.from_bytes(raw).as_dict()
+    to = fields.get('to')
+    return {
+        'nonce': fields['nonce'],
+        'to': to_checksum_address(to) if to else None,
+        'value': fields.get('value', 0),
+        'gas': fields['gas'],
+        'data': bytes(fields.get('data', b'')),
+    }
+
+
+def _gas_used(data: bytes) -> int:
+    # Intrinsic gas plus a flat execution cost
+    return 21000 + sum(4 if byte == 0 else 16 for byte in data) + 30000
+
+
+def serve(node: FakeNode, host: str, port: int) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            try:
+                response = node.handle(json.loads(body))
+            except ValueError:
+                response = {'jsonrpc': '2.0', 'id': None, 'error': {'code': -32700, 'message': 'parse error'}}
+            encoded = json.dumps(response).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(encoded)))
+            self.end_headers()
+            self.wfile.write(encoded)
+
+        def log_message(self, format, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), Handler)
@@ -0,0 +1,40 @@
+from django.db import models
+from web3 import Web3
+
+
+class AddressField(models.BinaryField):
+    """
+    Stores an address as its raw 20 bytes instead of 42 hex characters.
+
+    Values are read back as checksummed strings, and strings in any casing
+    are accepted for writes and lookups.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('max_length', 20)
+        kwargs.setdefault('editable', True)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if kwargs.get('max_length') == 20:
+            del kwargs['max_length']
+        kwargs.pop('editable', None)
+        return name, path, args, kwargs
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return Web3.to_checksum_address(bytes(value))
+
+    def to_python(self, value):
+        if value is None or isinstance(value, str):
+            return value
+        return Web3.to_checksum_address(bytes(value))
+
+    def get_prep_value(self, value):
+        if value is None:
+            return value
+        if isinstance(value, str):
+            value = bytes.fromhex(Web3.to_checksum_address(value)[2:])
+        return bytes(value)
@@ -0,0 +1,123 @@
+from dataclasses import dataclass
+
+from web3 import Web3
+
+
+UINT256_MAX = 2 ** 256 - 1
+# The forwarder's execute() takes the deadline as uint48
+UINT48_MAX = 2 ** 48 - 1
+
+
+class InvalidForwardRequest(ValueError):
+    pass
+
+
+@dataclass(frozen=True, slots=True)
+class ForwardRequest:
+    """
+    A validated ForwardRequest, parsed once per relay and shared by every
+    stage after it: addresses are checksummed, numbers are ints and calldata
+    is raw bytes.
+    """
+    sender: str
+    to: str
+    value: int
+    gas: int
+    nonce: int
+    deadline: int
+    data: bytes
+
+    @classmethod
+    def parse(cls, payload) -> 'ForwardRequest':
+        if not isinstance(payload, dict):
+            raise InvalidForwardRequest("request must be an object")
+        return cls(
+            sender=_address(payload, 'from'),
+            to=_address(payload, 'to'),
+            value=_uint(payload, 'value', UINT256_MAX),
+            gas=_uint(payload, 'gas', UINT256_MAX),
+            nonce=_uint(payload, 'nonce', UINT256_MAX),
+            deadline=_uint(payload, 'deadline', UINT48_MAX),
+            data=_hex_bytes(payload, 'data'),
+        )
+
+    @property
+    def selector(self) -> str:
+        return '0x' + self.data[:4].hex() if len(self.data) >= 4 else ''
+
+    def expired(self, now: float) -> bool:
+        return self.deadline < int(now)
+
+    def as_message(self) -> dict:
+        """EIP-712 message for the ForwardRequest type."""
+        return {
+            'from': self.sender,
+            'to': self.to,
+            'value': self.value,
+            'gas': self.gas,
+            'nonce': self.nonce,
+            'deadline': self.deadline,
+            'data': self.data,
+        }
+
+    def to_payload(self) -> dict:
+        """The request in its wire format, which parse() accepts back."""
+        return {
+            'from': self.sender,
+            'to': self.to,
+            'value': str(self.value),
+            'gas': str(self.gas),
+            'nonce': str(self.nonce),
+            'deadline': str(self.deadline),
+            'data': '0x' + self.data.hex(),
+        }
+
+    def as_tuple(self) -> tuple:
+        """Argument tuple for the forwarder's execute()."""
+        return (self.sender, self.to, self.value, self.gas, self.nonce, self.deadline, self.data)
+
+
+def parse_signature(value) -> bytes:
+    if not isinstance(value, str):
+        raise InvalidForwardRequest("signature must be a hex string")
+    try:
+        signature = bytes.fromhex(value[2:] if value.startswith('0x') else value)
+    except ValueError:
+        raise InvalidForwardRequest("signature must be a hex string")
+    if len(signature) != 65:
+        raise InvalidForwardRequest("signature must be 65 bytes")
+    return signature
+
+
+def _address(payload: dict, field: str) -> str:
+    value = payload.get(field)
+    if not isinstance(value, str) or len(value) != 42 or not value.startswith('0x'):
+        raise InvalidForwardRequest(f"{field} must be a 0x-prefixed 20-byte address")
+    try:
+        return Web3.to_checksum_address(value)
+    except ValueError:
+        raise InvalidForwardRequest(f"{field} must be a 0x-prefixed 20-byte address")
+
+
+def _uint(payload: dict, field: str, maximum: int) -> int:
+    value = payload.get(field)
+    # The SDK sends decimal strings; plain JSON integers are fine too
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise InvalidForwardRequest(f"{field} must be an unsigned integer")
+    # int() would also take whitespace, signs, underscores and non-ASCII digits
+    if isinstance(value, str) and not (value.isascii() and value.isdigit()):
+        raise InvalidForwardRequest(f"{field} must be an unsigned integer")
+    number = int(value)
+    if not 0 <= number <= maximum:
+        raise InvalidForwardRequest(f"{field} is out of range")
+    return number
+
+
+def _hex_bytes(payload: dict, field: str) -> bytes:
+    value = payload.get(field, '0x')
+    if not isinstance(value, str) or not value.startswith('0x'):
+        raise InvalidForwardRequest(f"{field} must be 0x-prefixed hex")
+    try:
+        return bytes.fromhex(value[2:])
+    except ValueError:
+        raise InvalidForwardRequest(f"{field} must be 0x-prefixed hex")
@@ -0,0 +1,307 @@
+import atexit
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import RelayedTransaction, RelayerKey
+
+
+class LeaseLost(Exception):
+    """This node no longer owns the relayer key it was about to use."""
+
+
+def default_node_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+class KeyLeaseManager:
+    """
+    Ownership leases on relayer keys, so that across backend instances each
+    key (and therefore its nonce sequence) is used by one node at a time.
+
+    A node holds at most `max_keys` keys and renews them every `ttl / 3`
+    seconds. Every nonce it hands out is a compare-and-set on the key's row
+    that only succeeds while the lease is still ours, which fences off a
+    node that stalled past its lease: it gets LeaseLost instead of reusing
+    a nonce its successor has already taken.
+
+    Nonces are never handed out twice, so a nonce that was taken but not
+    broadcast leaves a gap that would hold back every later transaction
+    from the key. Such nonces are filled with `fill_nonce(address, nonce)`,
+    a no-op transaction, and retried on every renewal until that works or
+    the chain shows the nonce used. A node taking over a key fills the
+    nonces between the chain's pending count and the stored next nonce the
+    same way, since its predecessor may have died before sending them.
+    Relays recorded with a filled nonce are marked 'dropped'.
+    """
+
+    def __init__(self, node_id: str, addresses: list, chain_nonce, fill_nonce, ttl: float = 30,
+                 max_keys: int = 1):
+        self.node_id = node_id
+        self.addresses = list(addresses)
+        self.chain_nonce = chain_nonce  # address -> pending nonce on chain
+        self.fill_nonce = fill_nonce
+        self.ttl = ttl
+        self.max_keys = max_keys
+
+        self._lock = threading.Lock()
+        self._held = {}  # address -> [next nonce, lease expiry (monotonic)]
+        self._gaps = {}  # address -> nonces taken but not broadcast, still to fill
+        self._thread = None
+
+    @classmethod
+    def from_settings(cls, addresses: list, chain_nonce, fill_nonce):
+        config = getattr(settings, 'RELAYER_CLUSTER', {})
+        return cls(
+            node_id=config.get('NODE_ID') or default_node_id(),
+            addresses=addresses,
+            chain_nonce=chain_nonce,
+            fill_nonce=fill_nonce,
+            ttl=config.get('KEY_LEASE_TTL', 30),
+            max_keys=config.get('KEYS_PER_NODE', 1),
+        )
+
+    def held(self) -> list:
+        """Relayer addresses this node may send with right now."""
+        self._ensure_started()
+        now = time.monotonic()
+        with self._lock:
+            return [address for address, (_, expires) in self._held.items() if expires > now]
+
+    def next_nonce(self, address: str) -> int:
+        with self._lock:
+            state = self._held.get(address)
+            if state is None or state[1] <= time.monotonic():
+                raise LeaseLost(f"Not holding relayer key {address}")
+            nonce = state[0]
+            claimed = RelayerKey.objects.filter(
+                address=address, owner=self.node_id, next_nonce=nonce,
+                lease_expires_at__gt=timezone.now(),
+            ).update(next_nonce=nonce + 1)
+            if not claimed:
+                del self._held[address]
+                raise LeaseLost(f"Lost relayer key {address}")
+            state[0] = nonce + 1
+            return nonce
+
+    def skip(self, address: str, nonce: int):
+        """
+        Give back a nonce from next_nonce() whose transaction was not sent.
+        Other threads may already hold later nonces, so rather than rewinding
+        the sequence the gap is filled.
+        """
+        self._fill(address, [nonce])
+
+    def renew(self):
+        """Extend held leases and pick up free or expired keys up to `max_keys`."""
+        now = timezone.now()
+        expires = now + timedelta(seconds=self.ttl)
+        # Count the lease from before the write, so we never think we hold it longer than the DB does
+        local_expires = time.monotonic() + self.ttl
+
+        with self._lock:
+            for address in list(self._held):
+                if RelayerKey.objects.filter(address=address, owner=self.node_id).update(lease_expires_at=expires):
+                    self._held[address][1] = local_expires
+                else:
+                    del self._held[address]
+            # A successor fills the gaps of keys we lost when it takes them over
+            gaps = {address: self._gaps.pop(address) for address in list(self._gaps)}
+            wanted = self.max_keys - len(self._held)
+            free = [address for address in self.addresses if address not in self._held]
+
+        for address, nonces in gaps.items():
+            if address in self._held:
+                self._fill(address, nonces)
+
+        for address in free:
+            if wanted <= 0:
+                break
+            if self._acquire(address, now, expires, local_expires):
+                wanted -= 1
+
+    def release(self):
+        with self._lock:
+            held, self._held = list(self._held), {}
+        RelayerKey.objects.filter(address__in=held, owner=self.node_id).update(owner='', lease_expires_at=None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'node': self.node_id,
+                'keys': {address: state[0] for address, state in self._held.items()},
+                'gaps': {address: sorted(nonces) for address, nonces in self._gaps.items()},
+            }
+
+    def _acquire(self, address: str, now, expires, local_expires) -> bool:
+        try:
+            with transaction.atomic():
+                RelayerKey.objects.get_or_create(address=address)
+        except IntegrityError:
+            # Another node inserted it first
+            pass
+        claimed = RelayerKey.objects.filter(
+            Q(owner='') | Q(lease_expires_at__isnull=True) | Q(lease_expires_at__lt=now),
+            address=address,
+        ).update(owner=self.node_id, lease_expires_at=expires)
+        if not claimed:
+            return False
+
+        # Nonces the previous owner took that the chain hasn't seen were
+        # either never sent or haven't propagated yet; fill them either way
+        stored = RelayerKey.objects.values_list('next_nonce', flat=True).get(address=address) or 0
+        pending = self.chain_nonce(address)
+        nonce = max(stored, pending)
+        if not RelayerKey.objects.filter(address=address, owner=self.node_id).update(next_nonce=nonce):
+            return False
+        self._fill(address, range(pending, stored))
+        with self._lock:
+            self._held[address] = [nonce, local_expires]
+        print(f"Relayer key {address} leased by {self.node_id} from nonce {nonce}"
+              + (f", filled nonces {pending}-{stored - 1}" if stored > pending else ''))
+        return True
+
+    def _fill(self, address: str, nonces):
+        filled, failed = [], []
+        for nonce in nonces:
+            try:
+                self.fill_nonce(address, nonce)
+                filled.append(nonce)
+            except Exception:
+                # Rejected because the nonce is used after all, or the node is unreachable
+                failed.append(nonce)
+        if filled:
+            # Relays recorded as broadcast with these nonces can never be mined
+            RelayedTransaction.objects.filter(relayer=address, relayer_nonce__in=filled).exclude(
+                status__in=RelayedTransaction.FINAL_STATUSES + RelayedTransaction.UNSENT_STATUSES
+            ).update(status='dropped', updated_at=timezone.now())
+        if not failed:
+            return
+        try:
+            pending = self.chain_nonce(address)
+        except Exception:
+            pending = 0
+        failed = [nonce for nonce in failed if nonce >= pending]
+        if failed:
+            print(f"Couldn't fill nonces {failed} of relayer key {address}, retrying on renewal")
+            with self._lock:
+                self._gaps.setdefault(address, set()).update(failed)
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='relayer-key-leases', daemon=True)
+        self.renew()
+        self._thread.start()
+        atexit.register(self.release)
+
+    def _run(self):
+        while True:
+            time.sleep(self.ttl / 3)
+            try:
+                self.renew()
+            except Exception as e:
+                print("Relayer key lease renewal failed:", e)
+            finally:
+                close_old_connections()
+
+
+class WorkQueue:
+    """
+    Relay requests persisted with status 'queued' for any node to send.
+
+    Nodes claim rows by leasing them for `ttl` seconds: with
+    SELECT ... FOR UPDATE SKIP LOCKED where the database supports it, and
+    otherwise with a conditional UPDATE that only matches rows whose lease
+    is free or expired. A claim writes a token unique to that claim, so a
+    row is only ever processed by the node whose token it carries.
+    """
+
+    def __init__(self, node_id: str, ttl: float = 60):
+        self.node_id = node_id
+        self.ttl = ttl
+
+    def claim(self, limit: int) -> list:
+        now = timezone.now()
+        token = f"{self.node_id}:{uuid.uuid4().hex[:8]}"
+        candidates = (
+            RelayedTransaction.objects
+            .filter(status='queued')
+            .filter(Q(lease_expires_at__isnull=True) | Q(lease_expires_at__lt=now))
+            .order_by('created_at', 'id')
+        )
+        lease = {'lease_owner': token, 'lease_expires_at': now + timedelta(seconds=self.ttl)}
+
+        if connection.features.has_select_for_update_skip_locked:
+            with transaction.atomic():
+                ids = list(candidates.select_for_update(skip_locked=True).values_list('id', flat=True)[:limit])
+                RelayedTransaction.objects.filter(id__in=ids).update(**lease)
+        else:
+            ids = list(candidates.values_list('id', flat=True)[:limit])
+            # Rows another node claimed since the read no longer match
+            candidates.filter(id__in=ids).update(**lease)
+
+        return list(
+            RelayedTransaction.objects
+            .filter(id__in=ids, lease_owner=token)
+            .select_related('calldata')
+            .order_by('created_at', 'id')
+        )
+
+    def heartbeat(self, rows: list) -> int:
+        """Extend the leases on rows this node is still working on."""
+        tokens = {row.lease_owner for row in rows}
+        return RelayedTransaction.objects.filter(
+            id__in=[row.id for row in rows], lease_owner__in=tokens, status='queued',
+        ).update(lease_expires_at=timezone.now() + timedelta(seconds=self.ttl))
+
+    def mark_sending(self, row, tx_hash: str, relayer: str, relayer_nonce: int) -> bool:
+        """
+        Record the signed transaction before it is broadcast. Fails if the
+        lease was lost, in which case the transaction must not be sent.
+        """
+        return bool(RelayedTransaction.objects.filter(
+            id=row.id, lease_owner=row.lease_owner, status='queued',
+            lease_expires_at__gt=timezone.now(),
+        ).update(status='sending', tx_hash=tx_hash, relayer=relayer, relayer_nonce=relayer_nonce,
+                 updated_at=timezone.now()))
+
+    def finish(self, row, status: str):
+        RelayedTransaction.objects.filter(id=row.id, lease_owner=row.lease_owner).update(
+            status=status, payload=None, lease_owner='', lease_expires_at=None,
+            updated_at=timezone.now(),
+        )
+
+    def release(self, row):
+        """Hand a claimed row back to the queue untouched."""
+        RelayedTransaction.objects.filter(id=row.id, lease_owner=row.lease_owner, status='queued').update(
+            lease_owner='', lease_expires_at=None,
+        )
+
+    def abandoned(self, limit: int = 100) -> list:
+        """Rows a node marked 'sending' and then stopped renewing."""
+        return list(
+            RelayedTransaction.objects
+            .filter(status='sending', lease_expires_at__lt=timezone.now())
+            .order_by('lease_expires_at')[:limit]
+        )
+
+    def recover(self, row, broadcast: bool) -> bool:
+        """
+        Settle an abandoned row: 'submitted' if its transaction reached the
+        chain, otherwise back to 'queued'. The forwarder's own nonce stops a
+        request that was in fact sent from executing twice.
+        """
+        fields = {'status': 'submitted', 'payload': None} if broadcast else {'status': 'queued', 'tx_hash': None}
+        return bool(RelayedTransaction.objects.filter(
+            id=row.id, status='sending', lease_owner=row.lease_owner,
+        ).update(lease_owner='', lease_expires_at=None, updated_at=timezone.now(), **fields))
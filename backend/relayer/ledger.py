@@ -0,0 +1,206 @@
+import atexit
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F, Sum
+
+from .models import GasSpend
+
+
+class SpendLedger:
+    """
+    Aggregates gas spent per sponsor in memory and flushes one row per
+    (sponsor, time bucket) every `flush_interval` seconds.
+
+    Each sponsor's spend for the current UTC day is kept as a running total,
+    so budget checks on the relay path are a dict lookup. The total is seeded
+    from the DB the first time a sponsor is seen each day and re-read after
+    every flush, which also picks up what other workers have spent.
+    """
+
+    def __init__(self, bucket_seconds: int = 3600, flush_interval: float = 10):
+        self.bucket_seconds = bucket_seconds
+        self.flush_interval = flush_interval
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = {}  # (sponsor, bucket) -> [gas_used, cost_wei, tx_count]
+        self._today = {}    # sponsor -> wei spent since self._day
+        self._day = None
+        self._thread = None
+
+    @classmethod
+    def from_settings(cls):
+        config = getattr(settings, 'RELAYER_LEDGER', {})
+        return cls(
+            bucket_seconds=config.get('BUCKET_SECONDS', 3600),
+            flush_interval=config.get('FLUSH_INTERVAL', 10),
+        )
+
+    def record(self, sponsor: str, gas_used: int, gas_price: int):
+        now = time.time()
+        cost = gas_used * gas_price
+        key = (sponsor, self._bucket(now))
+        with self._lock:
+            entry = self._pending.setdefault(key, [0, 0, 0])
+            entry[0] += gas_used
+            entry[1] += cost
+            entry[2] += 1
+            self._roll_day(now)
+            if sponsor in self._today:
+                self._today[sponsor] += cost
+            self._ensure_started()
+
+    def spent_today(self, sponsor: str) -> int:
+        with self._lock:
+            self._roll_day(time.time())
+            spent = self._today.get(sponsor)
+            day = self._day
+        if spent is not None:
+            return spent
+
+        # First sight of this sponsor today
+        spent = self._db_totals(day, [sponsor]).get(sponsor, 0)
+        with self._lock:
+            if self._day == day and sponsor not in self._today:
+                self._today[sponsor] = spent + self._pending_since(day, sponsor)
+            return self._today.get(sponsor, spent)
+
+    def within_budget(self, sponsor: str, budget: int = None) -> bool:
+        return budget is None or self.spent_today(sponsor) < budget
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                day = self._day
+                sponsors = list(self._today)
+            if not pending:
+                return 0
+
+            try:
+                self._write(pending)
+            except Exception as e:
+                print("Gas ledger flush failed, requeueing:", e)
+                self._requeue(pending)
+                raise
+
+            if day is not None and sponsors:
+                totals = self._db_totals(day, sponsors)
+                with self._lock:
+                    if self._day == day:
+                        for sponsor in sponsors:
+                            self._today[sponsor] = totals.get(sponsor, 0) + self._pending_since(day, sponsor)
+            return len(pending)
+
+    def report(self, sponsor: str = None, since: datetime = None, until: datetime = None) -> list:
+        """Per-bucket spend, including amounts not flushed yet."""
+        rows = GasSpend.objects.all()
+        if sponsor:
+            rows = rows.filter(sponsor=sponsor)
+        if since:
+            rows = rows.filter(bucket__gte=since)
+        if until:
+            rows = rows.filter(bucket__lt=until)
+
+        merged = {
+            (row['sponsor'], row['bucket']): [row['gas_used'], int(row['cost_wei']), row['tx_count']]
+            for row in rows.values('sponsor', 'bucket', 'gas_used', 'cost_wei', 'tx_count')
+        }
+        with self._lock:
+            pending = [(key, list(entry)) for key, entry in self._pending.items()]
+        for (key_sponsor, bucket), (gas_used, cost, count) in pending:
+            if sponsor and key_sponsor != sponsor:
+                continue
+            if (since and bucket < since) or (until and bucket >= until):
+                continue
+            entry = merged.setdefault((key_sponsor, bucket), [0, 0, 0])
+            entry[0] += gas_used
+            entry[1] += cost
+            entry[2] += count
+
+        return [
+            {'sponsor': key_sponsor, 'bucket': bucket, 'gasUsed': gas_used, 'costWei': str(cost), 'txCount': count}
+            for (key_sponsor, bucket), (gas_used, cost, count) in sorted(merged.items(), key=lambda item: (item[0][1], item[0][0]))
+        ]
+
+    def _bucket(self, now: float) -> datetime:
+        start = int(now) - int(now) % self.bucket_seconds
+        return datetime.fromtimestamp(start, tz=dt_timezone.utc)
+
+    def _roll_day(self, now: float):
+        # Caller holds self._lock
+        day = datetime.fromtimestamp(int(now) - int(now) % 86400, tz=dt_timezone.utc)
+        if day != self._day:
+            self._day = day
+            self._today = {}
+
+    def _pending_since(self, day: datetime, sponsor: str) -> int:
+        # Caller holds self._lock
+        return sum(
+            entry[1] for (key_sponsor, bucket), entry in self._pending.items()
+            if key_sponsor == sponsor and bucket >= day
+        )
+
+    def _db_totals(self, day: datetime, sponsors: list) -> dict:
+        rows = (
+            GasSpend.objects
+            .filter(sponsor__in=sponsors, bucket__gte=day, bucket__lt=day + timedelta(days=1))
+            .values('sponsor')
+            .annotate(total=Sum('cost_wei'))
+        )
+        return {row['sponsor']: int(row['total']) for row in rows}
+
+    def _write(self, pending: dict):
+        with transaction.atomic():
+            for (sponsor, bucket), (gas_used, cost, count) in pending.items():
+                if self._increment(sponsor, bucket, gas_used, cost, count):
+                    continue
+                try:
+                    with transaction.atomic():
+                        GasSpend.objects.create(
+                            sponsor=sponsor, bucket=bucket,
+                            gas_used=gas_used, cost_wei=cost, tx_count=count,
+                        )
+                except IntegrityError:
+                    # Another worker created the row first
+                    self._increment(sponsor, bucket, gas_used, cost, count)
+
+    def _increment(self, sponsor, bucket, gas_used, cost, count) -> int:
+        return GasSpend.objects.filter(sponsor=sponsor, bucket=bucket).update(
+            gas_used=F('gas_used') + gas_used,
+            cost_wei=F('cost_wei') + cost,
+            tx_count=F('tx_count') + count,
+        )
+
+    def _requeue(self, pending: dict):
+        with self._lock:
+            for key, (gas_used, cost, count) in pending.items():
+                entry = self._pending.setdefault(key, [0, 0, 0])
+                entry[0] += gas_used
+                entry[1] += cost
+                entry[2] += count
+
+    def _ensure_started(self):
+        # Caller holds self._lock
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='relayer-gas-ledger', daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                # Already requeued; retry on the next cycle
+                pass
+            finally:
+                close_old_connections()
+
+
+spend_ledger = SpendLedger.from_settings()
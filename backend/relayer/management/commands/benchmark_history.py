@@ -0,0 +1,96 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from relayer.models import Calldata, RelayedTransaction
+from relayer.pagination import HISTORY_FIELDS, encode_cursor, keyset_page
+
+BENCH_PREFIX = 'bench-'
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare keyset and OFFSET pagination of the transaction history at "
+        "increasing depths. Seeds synthetic rows (request_id prefixed with "
+        f"'{BENCH_PREFIX}') and removes them afterwards unless --keep is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000)
+        parser.add_argument('--senders', type=int, default=50)
+        parser.add_argument('--page-size', type=int, default=50)
+        parser.add_argument('--depths', default='0,1000,10000,100000,500000',
+                            help="Comma-separated row offsets to measure at")
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--keep', action='store_true', help="Keep the seeded rows")
+
+    def handle(self, *args, **options):
+        if RelayedTransaction.objects.filter(request_id__startswith=BENCH_PREFIX).exists():
+            raise CommandError("Benchmark rows from a previous run are still present; delete them first")
+
+        senders = [f"0x{i:040x}" for i in range(1, options['senders'] + 1)]
+        self.stdout.write(f"Seeding {options['rows']} rows across {len(senders)} senders...")
+        try:
+            self._seed(options['rows'], senders)
+
+            sender = senders[0]
+            base = RelayedTransaction.objects.filter(from_address=sender)
+            total = base.count()
+            page_size = options['page_size']
+            self.stdout.write(f"Sender {sender} has {total} rows, page size {page_size}\n")
+            self.stdout.write(f"{'depth':>10} {'offset ms':>12} {'keyset ms':>12}")
+
+            for depth in (int(d) for d in options['depths'].split(',')):
+                if depth >= total:
+                    continue
+                offset_ms = self._time(options['repeat'], lambda: list(
+                    base.order_by('-created_at', '-id').values(*HISTORY_FIELDS)[depth:depth + page_size]
+                ))
+                cursor = self._cursor_at(base, depth)
+                keyset_ms = self._time(options['repeat'], lambda: keyset_page(base, cursor, page_size))
+                self.stdout.write(f"{depth:>10} {offset_ms:>12.2f} {keyset_ms:>12.2f}")
+        finally:
+            if not options['keep']:
+                RelayedTransaction.objects.filter(request_id__startswith=BENCH_PREFIX).delete()
+
+    def _seed(self, rows: int, senders: list, batch: int = 10_000):
+        start = timezone.now() - timedelta(seconds=rows)
+        statuses = ['submitted', 'success', 'success', 'success', 'failed']
+        calldata = Calldata.from_bytes(bytes.fromhex('ab' * 68))
+        Calldata.objects.bulk_create([calldata], ignore_conflicts=True)
+
+        # Spread created_at over time instead of stamping every row with now()
+        for offset in range(0, rows, batch):
+            with transaction.atomic():
+                RelayedTransaction.objects.bulk_create([
+                    RelayedTransaction(
+                        request_id=f"{BENCH_PREFIX}{i}",
+                        from_address=random.choice(senders),
+                        to_address=senders[i % len(senders)],
+                        calldata=calldata,
+                        nonce=i,
+                        tx_hash=f"0x{i:064x}",
+                        status=random.choice(statuses),
+                        created_at=start + timedelta(seconds=i),
+                    )
+                    for i in range(offset, min(offset + batch, rows))
+                ])
+
+    def _cursor_at(self, queryset, depth: int):
+        if depth == 0:
+            return None
+        # The last row of the previous page, as a client would have it
+        row = queryset.order_by('-created_at', '-id').values('created_at', 'id')[depth - 1]
+        return encode_cursor(row['created_at'], row['id'])
+
+    def _time(self, repeat: int, fn) -> float:
+        best = float('inf')
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - started)
+        return best * 1000
@@ -0,0 +1,87 @@
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from relayer.models import ArchivedTransaction, Calldata, RelayedTransaction
+
+
+class Command(BaseCommand):
+    help = (
+        "Move finalized transactions older than --days into the archive table "
+        "in batches, then drop calldata blobs no live row references anymore."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=getattr(settings, 'RELAYER_RETENTION_DAYS', 30))
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true')
+        parser.add_argument('--vacuum', action='store_true',
+                            help="Reclaim freed pages afterwards (SQLite only)")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        expired = RelayedTransaction.objects.filter(
+            status__in=RelayedTransaction.FINAL_STATUSES,
+            created_at__lt=cutoff,
+        )
+
+        if options['dry_run']:
+            self.stdout.write(f"{expired.count()} transactions would be archived")
+            return
+
+        archived = blobs = 0
+        while True:
+            moved, freed = self._archive_batch(expired, options['batch_size'])
+            if not moved:
+                break
+            archived += moved
+            blobs += freed
+            self.stdout.write(f"Archived {archived} transactions, freed {blobs} calldata blobs")
+
+        if options['vacuum'] and connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('VACUUM')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: archived {archived} transactions, freed {blobs} calldata blobs"
+        ))
+
+    def _archive_batch(self, queryset, batch_size: int):
+        # Short transactions keep the write lock brief for the relay path
+        with transaction.atomic():
+            rows = list(queryset.select_related('calldata').order_by('id')[:batch_size])
+            if not rows:
+                return 0, 0
+
+            ArchivedTransaction.objects.bulk_create([
+                ArchivedTransaction(
+                    original_id=row.id,
+                    request_id=row.request_id,
+                    from_address=row.from_address,
+                    to_address=row.to_address,
+                    calldata=zlib.compress(row.calldata.to_bytes()),
+                    nonce=row.nonce,
+                    tx_hash=row.tx_hash,
+                    status=row.status,
+                    sponsor=row.sponsor,
+                    relayer=row.relayer,
+                    relayer_nonce=row.relayer_nonce,
+                    gas_used=row.gas_used,
+                    created_at=row.created_at,
+                    updated_at=row.updated_at,
+                )
+                for row in rows
+            ])
+            RelayedTransaction.objects.filter(id__in=[row.id for row in rows]).delete()
+
+            hashes = {bytes(row.calldata_id) for row in rows}
+            still_used = {
+                bytes(h) for h in
+                RelayedTransaction.objects.filter(calldata__in=hashes).values_list('calldata', flat=True)
+            }
+            freed, _ = Calldata.objects.filter(hash__in=hashes - still_used).delete()
+            return len(rows), freed
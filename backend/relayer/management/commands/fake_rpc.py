@@ -0,0 +1,36 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from relayer.fakenode import FakeNode, serve
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve a fake Ethereum JSON-RPC node for load tests and traffic "
+        "replays. Point the backend's RPC_URL at it."
+    )
+
+    # System checks import the views, which connect to RPC_URL
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8545)
+        parser.add_argument('--chain-id', type=int, default=int(os.getenv('CHAIN_ID', 11155111)))
+        parser.add_argument('--block-time', type=float, default=2,
+                            help="Seconds from broadcast until a transaction has a receipt")
+        parser.add_argument('--revert-rate', type=float, default=0,
+                            help="Fraction of transactions that fail (chosen by tx hash)")
+
+    def handle(self, *args, **options):
+        node = FakeNode(options['chain_id'], options['block_time'], options['revert_rate'])
+        server = serve(node, options['host'], options['port'])
+        self.stdout.write(f"Fake RPC node on http://{options['host']}:{options['port']} "
+                          f"(chain {options['chain_id']}, {options['block_time']}s blocks)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,262 @@
+import json
+import math
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from eth_account.messages import encode_typed_data
+
+from relayer.capture import TRACE_VERSION, test_account
+from relayer.forward_request import ForwardRequest, InvalidForwardRequest
+from relayer.services import FORWARD_REQUEST_TYPES, FORWARDER_DOMAIN
+
+ENDPOINTS = ('relay', 'nonce', 'status')
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay a trace recorded with RELAYER_CAPTURE against a running "
+        "backend (normally one whose RPC_URL points at `manage.py fake_rpc`) "
+        "and report latency and throughput, optionally against a baseline "
+        "report from another build."
+    )
+
+    # System checks import the views, which connect to RPC_URL
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('trace')
+        parser.add_argument('--url', default='http://127.0.0.1:8000/api')
+        parser.add_argument('--speed', type=float, default=1,
+                            help="Replay speed multiplier; 0 sends as fast as possible")
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument('--limit', type=int, help="Replay only the first N requests")
+        parser.add_argument('--label', default='', help="Name of the build under test, kept in the report")
+        parser.add_argument('--output', help="Write the JSON report here")
+        parser.add_argument('--compare', help="Baseline JSON report to diff against")
+
+    def handle(self, *args, **options):
+        entries = self._load(options['trace'], options['limit'])
+        if not entries:
+            raise CommandError("Trace has no replayable requests")
+        baseline = self._read_report(options['compare']) if options['compare'] else None
+
+        speed = options['speed']
+        span = entries[-1]['t'] - entries[0]['t']
+        self.stdout.write(
+            f"Replaying {len(entries)} requests spanning {span:.1f}s"
+            + (f" at {speed:g}x" if speed > 0 else " as fast as possible")
+        )
+        replay = _Replay(options['url'].rstrip('/'))
+        results = replay.run(entries, speed, options['concurrency'])
+
+        report = _report(entries, results, replay.duration, options['label'])
+        self._print(report)
+        if baseline:
+            self._print_comparison(baseline, report)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+
+    def _load(self, path: str, limit: int = None) -> list:
+        entries = []
+        skipped = 0
+        with open(path) as trace:
+            for line in trace:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    entry = None
+                if not isinstance(entry, dict):
+                    skipped += 1
+                    continue
+                if entry.get('v') != TRACE_VERSION or entry.get('e') not in ENDPOINTS:
+                    continue
+                # Without a timestamp, or a relay without its request object, there's nothing to replay
+                if (not isinstance(entry.get('t'), (int, float))
+                        or entry['e'] == 'relay' and not isinstance(entry.get('r'), dict)):
+                    skipped += 1
+                    continue
+                entries.append(entry)
+        if skipped:
+            self.stderr.write(f"Skipped {skipped} malformed or unreplayable lines")
+        # Lines from several workers are appended in flush order, not request order
+        entries.sort(key=lambda entry: entry['t'])
+        return entries[:limit] if limit else entries
+
+    def _read_report(self, path: str) -> dict:
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Can't read baseline report {path}: {e}")
+
+    def _print(self, report: dict):
+        self.stdout.write(
+            f"\n{report['requests']} requests in {report['duration']:.1f}s, "
+            f"{report['throughput']:.1f} req/s, scheduling lag p99 {report['lagP99']:.1f} ms"
+        )
+        self.stdout.write(f"{'endpoint':<8} {'count':>7} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} "
+                          f"{'p99 ms':>9} {'captured p95':>13}  statuses")
+        for endpoint, stats in report['endpoints'].items():
+            self.stdout.write(
+                f"{endpoint:<8} {stats['count']:>7} {stats['errors']:>7} {stats['p50']:>9.1f} "
+                f"{stats['p95']:>9.1f} {stats['p99']:>9.1f} {stats['capturedP95']:>13.1f}  "
+                + ' '.join(f"{code}:{count}" for code, count in sorted(stats['statuses'].items()))
+            )
+
+    def _print_comparison(self, baseline: dict, report: dict):
+        name = baseline.get('label') or 'baseline'
+        self.stdout.write(f"\nAgainst {name}:")
+        self.stdout.write(f"{'metric':<20} {'baseline':>10} {'current':>10} {'change':>9}")
+        rows = [('throughput req/s', baseline.get('throughput'), report['throughput'], True)]
+        for endpoint, stats in report['endpoints'].items():
+            before = baseline.get('endpoints', {}).get(endpoint, {})
+            for metric in ('p50', 'p95', 'p99', 'errors'):
+                rows.append((f"{endpoint} {metric}", before.get(metric), stats[metric], False))
+
+        for metric, before, after, higher_is_better in rows:
+            if before is None:
+                continue
+            change = (after - before) / before * 100 if before else 0.0
+            line = f"{metric:<20} {before:>10.1f} {after:>10.1f} {change:>+8.1f}%"
+            worse = change < -10 if higher_is_better else change > 10
+            self.stdout.write(self.style.ERROR(line) if worse else line)
+
+
+class _Replay:
+    def __init__(self, url: str):
+        self.url = url
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._tx_hashes = {}  # captured tx hash or requestId -> replayed one
+        self._etags = {}      # replayed tx hash -> last ETag
+        self.duration = 0.0
+
+    def run(self, entries: list, speed: float, concurrency: int) -> list:
+        first = entries[0]['t']
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            futures = []
+            for entry in entries:
+                due = started + ((entry['t'] - first) / speed if speed > 0 else 0)
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                futures.append(pool.submit(self._send, entry, due))
+            results = [future.result() for future in futures]
+        self.duration = time.perf_counter() - started
+        return results
+
+    def _send(self, entry: dict, due: float) -> tuple:
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+
+        endpoint = entry['e']
+        if endpoint == 'relay':
+            # Signing happens before the clock starts
+            method, url, kwargs = 'post', f"{self.url}/relay/", {'json': self._relay_body(entry)}
+        elif endpoint == 'nonce':
+            address = test_account(entry['k']).address if 'k' in entry else entry.get('a', '')
+            method, url, kwargs = 'get', f"{self.url}/nonce", {'params': {'address': address}}
+        else:
+            with self._lock:
+                ref = self._tx_hashes.get(entry.get('ref'), entry.get('ref'))
+                etag = self._etags.get(ref)
+            headers = {'If-None-Match': etag} if entry.get('inm') and etag else {}
+            method, url, kwargs = 'get', f"{self.url}/status/{ref}/", {'headers': headers}
+
+        begin = time.perf_counter()
+        try:
+            response = session.request(method, url, timeout=60, **kwargs)
+            code = response.status_code
+        except requests.RequestException:
+            response, code = None, 0
+        latency = time.perf_counter() - begin
+
+        if response is not None and code < 400:
+            self._remember(entry, endpoint, response)
+        return endpoint, code, latency, begin - due
+
+    def _relay_body(self, entry: dict) -> dict:
+        request = dict(entry['r'])
+        if 'k' not in entry:
+            return {'request': request, 'signature': entry.get('s')}
+
+        # Re-sign with the pseudonym's test key and a deadline as far out as the original
+        account = test_account(entry['k'])
+        request['from'] = account.address
+        try:
+            request['deadline'] = str(int(time.time()) + int(request.pop('dl', 3600)))
+            forward_request = ForwardRequest.parse(request)
+        except (InvalidForwardRequest, TypeError, ValueError):
+            # Malformed when recorded too; send it as is so the backend's
+            # rejection path is replayed rather than the whole run failing
+            return {'request': request, 'signature': None}
+        signable = encode_typed_data(full_message={
+            'types': FORWARD_REQUEST_TYPES,
+            'primaryType': 'ForwardRequest',
+            'domain': FORWARDER_DOMAIN,
+            'message': forward_request.as_message(),
+        })
+        signature = account.sign_message(signable).signature
+        return {'request': request, 'signature': '0x' + bytes(signature).hex()}
+
+    def _remember(self, entry: dict, endpoint: str, response):
+        with self._lock:
+            if endpoint == 'relay' and entry.get('tx'):
+                try:
+                    body = response.json()
+                except ValueError:
+                    return
+                self._tx_hashes[entry['tx']] = body.get('txHash') or body.get('requestId')
+            elif endpoint == 'status' and response.headers.get('ETag'):
+                self._etags[response.url.rstrip('/').rsplit('/', 1)[-1]] = response.headers['ETag']
+
+
+def _percentile(values: list, fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def _report(entries: list, results: list, duration: float, label: str) -> dict:
+    latencies = defaultdict(list)
+    statuses = defaultdict(Counter)
+    captured = defaultdict(list)
+    for entry in entries:
+        captured[entry['e']].append(entry.get('ms', 0))
+    for endpoint, code, latency, _ in results:
+        latencies[endpoint].append(latency * 1000)
+        statuses[endpoint][code] += 1
+
+    endpoints = {}
+    for endpoint in ENDPOINTS:
+        values = latencies.get(endpoint)
+        if not values:
+            continue
+        endpoints[endpoint] = {
+            'count': len(values),
+            # 4xx are the backend's own answers (expired, busy, ...); count
+            # only server errors and requests that got no response
+            'errors': sum(count for code, count in statuses[endpoint].items() if code == 0 or code >= 500),
+            'statuses': {str(code): count for code, count in statuses[endpoint].items()},
+            'mean': sum(values) / len(values),
+            'p50': _percentile(values, 0.50),
+            'p95': _percentile(values, 0.95),
+            'p99': _percentile(values, 0.99),
+            'capturedP95': _percentile(captured[endpoint], 0.95),
+        }
+    return {
+        'label': label,
+        'requests': len(results),
+        'duration': duration,
+        'throughput': len(results) / duration if duration else 0.0,
+        'lagP99': _percentile([lag * 1000 for *_, lag in results], 0.99),
+        'endpoints': endpoints,
+    }
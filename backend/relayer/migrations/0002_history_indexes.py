@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-19 16:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('relayer', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='relayedtransaction',
+            name='relayed_tra_from_ad_f2973b_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='relayedtransaction',
+            name='relayed_tra_status_7889d4_idx',
+        ),
+        migrations.AddIndex(
+            model_name='relayedtransaction',
+            index=models.Index(fields=['from_address', 'created_at', 'id'], name='relayed_tra_from_ad_6f36d4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='relayedtransaction',
+            index=models.Index(fields=['to_address', 'created_at', 'id'], name='relayed_tra_to_addr_98464a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='relayedtransaction',
+            index=models.Index(fields=['status', 'created_at', 'id'], name='relayed_tra_status_2df0bd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='relayedtransaction',
+            index=models.Index(fields=['created_at', 'id'], name='relayed_tra_created_5226af_idx'),
+        ),
+    ]
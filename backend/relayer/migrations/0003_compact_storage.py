@@ -0,0 +1,183 @@
+import hashlib
+import zlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+import relayer.fields
+
+
+BATCH_SIZE = 2000
+
+
+def to_compact(apps, schema_editor):
+    RelayedTransaction = apps.get_model('relayer', 'RelayedTransaction')
+    Calldata = apps.get_model('relayer', 'Calldata')
+
+    last_id = 0
+    while True:
+        rows = list(RelayedTransaction.objects.filter(id__gt=last_id).order_by('id')[:BATCH_SIZE])
+        if not rows:
+            break
+        blobs = {}
+        for row in rows:
+            data = row.data or '0x'
+            raw = bytes.fromhex(data[2:] if data.startswith('0x') else data)
+            digest = hashlib.sha256(raw).digest()
+            if digest not in blobs:
+                packed = zlib.compress(raw)
+                compressed = len(packed) < len(raw)
+                blobs[digest] = Calldata(hash=digest, body=packed if compressed else raw, compressed=compressed)
+            row.calldata_id = digest
+            row.from_address_bin = row.from_address
+            row.to_address_bin = row.to_address
+        Calldata.objects.bulk_create(blobs.values(), ignore_conflicts=True)
+        RelayedTransaction.objects.bulk_update(rows, ['calldata', 'from_address_bin', 'to_address_bin'])
+        last_id = rows[-1].id
+
+
+def to_text(apps, schema_editor):
+    RelayedTransaction = apps.get_model('relayer', 'RelayedTransaction')
+    Calldata = apps.get_model('relayer', 'Calldata')
+
+    last_id = 0
+    while True:
+        rows = list(RelayedTransaction.objects.filter(id__gt=last_id).order_by('id')[:BATCH_SIZE])
+        if not rows:
+            break
+        blobs = Calldata.objects.in_bulk({row.calldata_id for row in rows})
+        for row in rows:
+            blob = blobs[row.calldata_id]
+            body = bytes(blob.body)
+            row.data = '0x' + (zlib.decompress(body) if blob.compressed else body).hex()
+            row.from_address = row.from_address_bin
+            row.to_address = row.to_address_bin
+        RelayedTransaction.objects.bulk_update(rows, ['data', 'from_address', 'to_address'])
+        last_id = rows[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('relayer', '0002_history_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Calldata',
+            fields=[
+                ('hash', models.BinaryField(max_length=32, primary_key=True, serialize=False)),
+                ('body', models.BinaryField()),
+                ('compressed', models.BooleanField(default=False)),
+            ],
+            options={
+                'db_table': 'relayer_calldata',
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedTransaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_id', models.BigIntegerField()),
+                ('request_id', models.CharField(max_length=66)),
+                ('from_address', relayer.fields.AddressField()),
+                ('to_address', relayer.fields.AddressField()),
+                ('calldata', models.BinaryField()),
+                ('nonce', models.BigIntegerField()),
+                ('tx_hash', models.CharField(blank=True, max_length=66, null=True)),
+                ('status', models.CharField(max_length=20)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'relayed_transactions_archive',
+                'indexes': [models.Index(fields=['from_address', 'created_at'], name='relayed_tra_from_ad_fb78bc_idx')],
+            },
+        ),
+        migrations.AddField(
+            model_name='relayedtransaction',
+            name='calldata',
+            field=models.ForeignKey(db_column='calldata_hash', null=True, on_delete=django.db.models.deletion.PROTECT, to='relayer.calldata'),
+        ),
+        migrations.AddField(
+            model_name='relayedtransaction',
+            name='from_address_bin',
+            field=relayer.fields.AddressField(null=True),
+        ),
+        migrations.AddField(
+            model_name='relayedtransaction',
+            name='to_address_bin',
+            field=relayer.fields.AddressField(null=True),
+        ),
+        # Nullable so that unapplying can re-add the columns before to_text fills them
+        migrations.AlterField(
+            model_name='relayedtransaction',
+            name='data',
+            field=models.TextField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='relayedtransaction',
+            name='from_address',
+            field=models.CharField(max_length=42, null=True),
+        ),
+        migrations.AlterField(
+            model_name='relayedtransaction',
+            name='to_address',
+            field=models.CharField(max_length=42, null=True),
+        ),
+        migrations.RunPython(to_compact, to_text),
+        migrations.RemoveIndex(
+            model_name='relayedtransaction',
+            name='relayed_tra_from_ad_6f36d4_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='relayedtransaction',
+            name='relayed_tra_to_addr_98464a_idx',
+        ),
+        migrations.RemoveField(
+            model_name='relayedtransaction',
+            name='data',
+        ),
+        migrations.RemoveField(
+            model_name='relayedtransaction',
+            name='from_address',
+        ),
+        migrations.RemoveField(
+            model_name='relayedtransaction',
+            name='to_address',
+        ),
+        migrations.RenameField(
+            model_name='relayedtransaction',
+            old_name='from_address_bin',
+            new_name='from_address',
+        ),
+        migrations.RenameField(
+            model_name='relayedtransaction',
+            old_name='to_address_bin',
+            new_name='to_address',
+        ),
+        migrations.AlterField(
+            model_name='relayedtransaction',
+            name='calldata',
+            field=models.ForeignKey(db_column='calldata_hash', on_delete=django.db.models.deletion.PROTECT, to='relayer.calldata'),
+        ),
+        migrations.AlterField(
+            model_name='relayedtransaction',
+            name='from_address',
+            field=relayer.fields.AddressField(),
+        ),
+        migrations.AlterField(
+            model_name='relayedtransaction',
+            name='to_address',
+            field=relayer.fields.AddressField(),
+        ),
+        migrations.AddIndex(
+            model_name='relayedtransaction',
+            index=models.Index(fields=['from_address', 'created_at', 'id'], name='relayed_tra_from_ad_6f36d4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='relayedtransaction',
+            index=models.Index(fields=['to_address', 'created_at', 'id'], name='relayed_tra_to_addr_98464a_idx'),
+        ),
+    ]
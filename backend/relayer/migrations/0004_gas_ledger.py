@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-19 16:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('relayer', '0003_compact_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedtransaction',
+            name='sponsor',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='relayedtransaction',
+            name='sponsor',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.CreateModel(
+            name='GasSpend',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sponsor', models.CharField(max_length=64)),
+                ('bucket', models.DateTimeField()),
+                ('gas_used', models.BigIntegerField(default=0)),
+                ('cost_wei', models.DecimalField(decimal_places=0, default=0, max_digits=40)),
+                ('tx_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'relayer_gas_spend',
+                'indexes': [models.Index(fields=['bucket'], name='relayer_gas_bucket_f45ef1_idx')],
+                'constraints': [models.UniqueConstraint(fields=('sponsor', 'bucket'), name='unique_sponsor_bucket')],
+            },
+        ),
+    ]
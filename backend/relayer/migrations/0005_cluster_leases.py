@@ -0,0 +1,51 @@
+# Generated by Django 5.2.8 on 2026-10-19 16:49
+
+import relayer.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('relayer', '0004_gas_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelayerKey',
+            fields=[
+                ('address', relayer.fields.AddressField(primary_key=True, serialize=False)),
+                ('owner', models.CharField(blank=True, default='', max_length=80)),
+                ('lease_expires_at', models.DateTimeField(blank=True, null=True)),
+                ('next_nonce', models.BigIntegerField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'relayer_keys',
+            },
+        ),
+        migrations.AddField(
+            model_name='relayedtransaction',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='relayedtransaction',
+            name='lease_owner',
+            field=models.CharField(blank=True, default='', max_length=80),
+        ),
+        migrations.AddField(
+            model_name='relayedtransaction',
+            name='payload',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='relayedtransaction',
+            name='relayer',
+            field=relayer.fields.AddressField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='relayedtransaction',
+            name='relayer_nonce',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-19 17:05
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('relayer', '0005_cluster_leases'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='relayedtransaction',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 17:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('relayer', '0006_created_at_default'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='relayedtransaction',
+            name='gas_used',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-19 17:19
+
+import relayer.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('relayer', '0007_billing_marker'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedtransaction',
+            name='gas_used',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='archivedtransaction',
+            name='relayer',
+            field=relayer.fields.AddressField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='archivedtransaction',
+            name='relayer_nonce',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 17:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('relayer', '0008_archive_relay_columns'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='relayedtransaction',
+            name='deadline',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -1,19 +1,160 @@
+import hashlib
+import zlib
+
 from django.db import models
+from django.utils import timezone
+
+from .fields import AddressField
+
+
+class Calldata(models.Model):
+    """
+    Calldata blobs, deduplicated by their SHA-256.
+
+    Relays from the same dApp tend to repeat the same few payloads, so rows
+    reference a shared blob instead of each carrying its own hex copy.
+    """
+    hash = models.BinaryField(max_length=32, primary_key=True)
+    body = models.BinaryField()
+    compressed = models.BooleanField(default=False)
+
+    class Meta:
+        db_table = 'relayer_calldata'
+
+    @classmethod
+    def from_hex(cls, data: str) -> 'Calldata':
+        raw = bytes.fromhex(data[2:] if data.startswith('0x') else data)
+        return cls.from_bytes(raw)
+
+    @classmethod
+    def from_bytes(cls, raw: bytes) -> 'Calldata':
+        packed = zlib.compress(raw)
+        # Short calldata rarely shrinks, keep it as is then
+        if len(packed) < len(raw):
+            return cls(hash=hashlib.sha256(raw).digest(), body=packed, compressed=True)
+        return cls(hash=hashlib.sha256(raw).digest(), body=raw, compressed=False)
+
+    def to_bytes(self) -> bytes:
+        body = bytes(self.body)
+        return zlib.decompress(body) if self.compressed else body
+
+    def to_hex(self) -> str:
+        return '0x' + self.to_bytes().hex()
+
 
 class RelayedTransaction(models.Model):
     request_id = models.CharField(max_length=66, unique=True, db_index=True)
-    from_address = models.CharField(max_length=42)
-    to_address = models.CharField(max_length=42)
-    data = models.TextField()
+    from_address = AddressField()
+    to_address = AddressField()
+    calldata = models.ForeignKey(Calldata, on_delete=models.PROTECT, db_column='calldata_hash')
     nonce = models.BigIntegerField()
+    # The forward request's deadline (unix seconds); the forwarder won't
+    # execute it afterwards
+    deadline = models.BigIntegerField(null=True, blank=True)
     tx_hash = models.CharField(max_length=66, null=True, blank=True)
     status = models.CharField(max_length=20, default='pending')
-    created_at = models.DateTimeField(auto_now_add=True)
+    sponsor = models.CharField(max_length=64, blank=True, default='')
+    # Key and nonce the relay was broadcast with
+    relayer = AddressField(null=True, blank=True)
+    relayer_nonce = models.BigIntegerField(null=True, blank=True)
+    # Requests handed off to the cluster queue ('queued') keep the signed
+    # request here until a node sends them; see leasing.WorkQueue
+    payload = models.JSONField(null=True, blank=True)
+    lease_owner = models.CharField(max_length=80, blank=True, default='')
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    # Receipt gas, set when the spend is booked to the sponsor's ledger;
+    # None means not billed yet. See receipts.ReceiptWatcher
+    gas_used = models.BigIntegerField(null=True, blank=True)
+    # Not auto_now_add: the write-behind buffer assigns it when the relay is
+    # accepted and readers see that value before and after the flush
+    created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Outcome read from a receipt
+    SETTLED_STATUSES = ('success', 'failed')
+    # No longer in flight. 'dropped' rows were given up on, or their relayer
+    # nonce went to a filler transaction; the receipt sweep still settles one
+    # that turns up mined after all
+    FINAL_STATUSES = SETTLED_STATUSES + ('dropped',)
+    # Handed off to the cluster queue and not broadcast yet
+    UNSENT_STATUSES = ('queued', 'sending')
+
     class Meta:
         db_table = 'relayed_transactions'
+        # Composite indexes match the history endpoint's keyset order, so a
+        # filtered page is a single range scan on (column, created_at, id).
+        indexes = [
+            models.Index(fields=['from_address', 'created_at', 'id']),
+            models.Index(fields=['to_address', 'created_at', 'id']),
+            models.Index(fields=['status', 'created_at', 'id']),
+            models.Index(fields=['created_at', 'id']),
+        ]
+
+    @property
+    def data(self) -> str:
+        return self.calldata.to_hex()
+
+
+class RelayerKey(models.Model):
+    """
+    Ownership lease on a relayer key. Only the node named in `owner` may
+    send with the key until `lease_expires_at`, and it takes nonces from
+    `next_nonce`; see leasing.KeyLeaseManager.
+    """
+    address = AddressField(primary_key=True)
+    owner = models.CharField(max_length=80, blank=True, default='')
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    next_nonce = models.BigIntegerField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'relayer_keys'
+
+
+class GasSpend(models.Model):
+    """
+    Gas paid on behalf of a sponsor, aggregated per time bucket. Rows are
+    written by SpendLedger flushes, never per transaction.
+    """
+    sponsor = models.CharField(max_length=64)
+    bucket = models.DateTimeField()
+    gas_used = models.BigIntegerField(default=0)
+    cost_wei = models.DecimalField(max_digits=40, decimal_places=0, default=0)
+    tx_count = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'relayer_gas_spend'
+        constraints = [
+            models.UniqueConstraint(fields=['sponsor', 'bucket'], name='unique_sponsor_bucket'),
+        ]
+        indexes = [
+            models.Index(fields=['bucket']),
+        ]
+
+
+class ArchivedTransaction(models.Model):
+    """
+    Finalized transactions moved out of `relayed_transactions` by the
+    `compact_transactions` command. Calldata is stored inline (compressed)
+    so the live blob table can be pruned.
+    """
+    original_id = models.BigIntegerField()
+    request_id = models.CharField(max_length=66)
+    from_address = AddressField()
+    to_address = AddressField()
+    calldata = models.BinaryField()
+    nonce = models.BigIntegerField()
+    tx_hash = models.CharField(max_length=66, null=True, blank=True)
+    status = models.CharField(max_length=20)
+    sponsor = models.CharField(max_length=64, blank=True, default='')
+    relayer = AddressField(null=True, blank=True)
+    relayer_nonce = models.BigIntegerField(null=True, blank=True)
+    gas_used = models.BigIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'relayed_transactions_archive'
         indexes = [
-            models.Index(fields=['from_address']),
-            models.Index(fields=['status']),
+            models.Index(fields=['from_address', 'created_at']),
         ]
@@ -0,0 +1,41 @@
+import json
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - falls back to the stdlib
+    orjson = None
+
+
+class FastJSONParser(BaseParser):
+    """
+    JSON parser for the relay hot path. Uses orjson when it is installed and
+    skips DRF's generic decoding layers, which the relay payload doesn't need.
+    """
+    media_type = 'application/json'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        body = stream.read() if stream is not None else b''
+        try:
+            if orjson is not None:
+                return orjson.loads(body)
+            return json.loads(body)
+        except ValueError as e:
+            raise ParseError(f"JSON parse error - {e}")
+
+
+class FastJSONRenderer(BaseRenderer):
+    """Compact JSON renderer for small, flat responses such as the relay result."""
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if orjson is not None:
+            return orjson.dumps(data)
+        return json.dumps(data, separators=(',', ':')).encode()
@@ -0,0 +1,205 @@
+import atexit
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import Calldata, RelayedTransaction
+
+
+class WriteBehindBuffer:
+    """
+    Buffers RelayedTransaction inserts and status transitions in memory and
+    writes them with bulk_create/bulk_update in a single transaction.
+
+    A flush happens when `max_batch` events are pending or the oldest event
+    has waited `max_delay` seconds. If the flusher falls behind and
+    `max_pending` events pile up, the caller flushes inline, so at most
+    `max_pending` events (or `max_delay` seconds of traffic) can be lost
+    if the process dies.
+    """
+
+    def __init__(self, max_batch: int = 200, max_delay: float = 0.5, max_pending: int = 5000):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._inserts = {}   # tx_hash -> unsaved RelayedTransaction
+        self._statuses = {}  # tx_hash -> (status, gas_used) for rows already in the DB
+        self._flushing = {}  # inserts taken by a flush that has not committed
+        self._oldest = None
+        self._thread = None
+
+    @classmethod
+    def from_settings(cls):
+        config = getattr(settings, 'RELAYER_WRITE_BEHIND', {})
+        return cls(
+            max_batch=config.get('MAX_BATCH', 200),
+            max_delay=config.get('MAX_DELAY', 0.5),
+            max_pending=config.get('MAX_PENDING', 5000),
+        )
+
+    def add(self, **fields) -> RelayedTransaction:
+        # Stamped on acceptance and stored as is, so reads before and after the flush agree
+        fields.setdefault('created_at', timezone.now())
+        if 'data' in fields:
+            fields['calldata'] = Calldata.from_hex(fields.pop('data'))
+        tx = RelayedTransaction(**fields)
+        with self._lock:
+            self._inserts[tx.tx_hash] = tx
+            size = self._queued()
+        self._after_queue(size)
+        return tx
+
+    def set_status(self, tx_hash: str, status: str, gas_used: int = None):
+        """Queue a status change; `gas_used` marks the transaction as billed."""
+        with self._lock:
+            pending = self._inserts.get(tx_hash)
+            if pending is not None:
+                # Not written yet, so the insert simply carries the new status
+                pending.status = status
+                if gas_used is not None:
+                    pending.gas_used = gas_used
+                return
+            if gas_used is None and tx_hash in self._statuses:
+                # Don't drop a billing marker still waiting for its flush
+                gas_used = self._statuses[tx_hash][1]
+            self._statuses[tx_hash] = (status, gas_used)
+            size = self._queued()
+        self._after_queue(size)
+
+    def get(self, tx_hash: str):
+        """Return a transaction that has been accepted but not flushed yet."""
+        with self._lock:
+            return self._inserts.get(tx_hash) or self._flushing.get(tx_hash)
+
+    def next_nonce(self, sender: str):
+        """One past the highest forwarder nonce `sender` has in the buffer, or None."""
+        with self._lock:
+            nonces = [
+                tx.nonce for tx in (*self._inserts.values(), *self._flushing.values())
+                if tx.from_address == sender
+            ]
+        return max(nonces) + 1 if nonces else None
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._inserts) + len(self._statuses)
+
+    def _queued(self) -> int:
+        # Caller holds self._lock
+        if self._oldest is None:
+            self._oldest = time.monotonic()
+        self._ensure_started()
+        return len(self._inserts) + len(self._statuses)
+
+    def _after_queue(self, size: int):
+        if size >= self.max_pending:
+            # The flusher is behind; write on the caller's thread to bound memory
+            self.flush()
+        elif size >= self.max_batch:
+            self._wakeup.set()
+
+    def _ensure_started(self):
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name='relayer-write-behind', daemon=True
+            )
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.max_delay)
+            self._wakeup.clear()
+            with self._lock:
+                oldest = self._oldest
+                size = len(self._inserts) + len(self._statuses)
+            if oldest is None:
+                continue
+            if size >= self.max_batch or time.monotonic() - oldest >= self.max_delay:
+                try:
+                    self.flush()
+                except Exception:
+                    # Already requeued; retry on the next cycle
+                    pass
+                finally:
+                    close_old_connections()
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            with self._lock:
+                inserts, self._inserts = self._inserts, {}
+                statuses, self._statuses = self._statuses, {}
+                self._flushing = inserts
+                self._oldest = None
+            if not inserts and not statuses:
+                return 0
+
+            try:
+                self._write(inserts, statuses)
+            except Exception as e:
+                print("Write-behind flush failed, requeueing:", e)
+                self._requeue(inserts, statuses)
+                raise
+            finally:
+                with self._lock:
+                    self._flushing = {}
+            return len(inserts) + len(statuses)
+
+    def _write(self, inserts: dict, statuses: dict):
+        with transaction.atomic():
+            if inserts:
+                blobs = {tx.calldata_id: tx.calldata for tx in inserts.values()}
+                Calldata.objects.bulk_create(
+                    blobs.values(), batch_size=self.max_batch, ignore_conflicts=True
+                )
+                RelayedTransaction.objects.bulk_create(
+                    inserts.values(), batch_size=self.max_batch
+                )
+            if statuses:
+                now = timezone.now()
+                rows = list(
+                    RelayedTransaction.objects.filter(tx_hash__in=statuses.keys()).only('id', 'tx_hash')
+                )
+                billed, others = [], []
+                for row in rows:
+                    row.status, gas_used = statuses[row.tx_hash]
+                    # bulk_update bypasses auto_now
+                    row.updated_at = now
+                    if gas_used is not None:
+                        row.gas_used = gas_used
+                        billed.append(row)
+                    else:
+                        others.append(row)
+                # gas_used is written only where a marker is queued: writing
+                # back the value read above could undo a marker another node
+                # committed in between and have the sweep bill it again
+                RelayedTransaction.objects.bulk_update(
+                    billed, ['status', 'gas_used', 'updated_at'], batch_size=self.max_batch
+                )
+                RelayedTransaction.objects.bulk_update(
+                    others, ['status', 'updated_at'], batch_size=self.max_batch
+                )
+
+    def _requeue(self, inserts: dict, statuses: dict):
+        with self._lock:
+            # Anything queued since the failed flush is newer and wins
+            for tx_hash, tx in inserts.items():
+                self._inserts.setdefault(tx_hash, tx)
+            for tx_hash, (status, gas_used) in statuses.items():
+                newer = self._statuses.get(tx_hash)
+                if newer is None:
+                    self._statuses[tx_hash] = (status, gas_used)
+                elif newer[1] is None:
+                    self._statuses[tx_hash] = (newer[0], gas_used)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+
+
+write_buffer = WriteBehindBuffer.from_settings()
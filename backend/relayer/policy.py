@@ -0,0 +1,200 @@
+import json
+import os
+import threading
+import time
+from collections import Counter, namedtuple
+
+from django.conf import settings
+
+from .forward_request import ForwardRequest
+
+
+WILDCARD = '*'
+
+Decision = namedtuple('Decision', ['allowed', 'rule_id', 'sponsor', 'tier'])
+
+
+class PolicyError(ValueError):
+    pass
+
+
+class Rule:
+    """
+    One allow/deny rule. Empty `targets`, `selectors` or `senders` match
+    anything; `max_value`/`max_gas` only apply to allow rules. Gas for
+    requests an allow rule lets through is billed to its `sponsor`, which
+    defaults to the rule id, and scheduled in its priority `tier`.
+    """
+    __slots__ = ('id', 'order', 'allow', 'sponsor', 'tier', 'targets', 'selectors', 'senders', 'max_value', 'max_gas')
+
+    def __init__(self, spec: dict, order: int):
+        try:
+            self.id = str(spec.get('id') or f"rule-{order}")
+            action = spec.get('action', 'allow')
+            if action not in ('allow', 'deny'):
+                raise PolicyError(f"{self.id}: action must be 'allow' or 'deny'")
+            self.order = order
+            self.allow = action == 'allow'
+            self.sponsor = str(spec.get('sponsor') or self.id)
+            self.tier = spec.get('tier')
+            self.targets = frozenset(a.lower() for a in spec.get('targets', ()))
+            self.selectors = frozenset(s.lower() for s in spec.get('selectors', ()))
+            self.senders = frozenset(a.lower() for a in spec.get('senders', ()))
+            self.max_value = int(spec['max_value']) if spec.get('max_value') is not None else None
+            self.max_gas = int(spec['max_gas']) if spec.get('max_gas') is not None else None
+        except (AttributeError, TypeError, ValueError) as e:
+            raise PolicyError(f"Invalid rule {spec!r}: {e}")
+
+        for selector in self.selectors:
+            if len(selector) != 10 or not selector.startswith('0x'):
+                raise PolicyError(f"{self.id}: selector {selector} must be 4 bytes, e.g. 0xa9059cbb")
+
+    def within_limits(self, value: int, gas: int) -> bool:
+        if self.max_value is not None and value > self.max_value:
+            return False
+        if self.max_gas is not None and gas > self.max_gas:
+            return False
+        return True
+
+
+class CompiledPolicy:
+    """
+    Rules indexed by (target, selector, sender), with '*' standing in for
+    whichever of the three a rule leaves unconstrained, so sender-only rules
+    are looked up by sender rather than scanned. Evaluating a request takes
+    eight dict lookups plus a limits check per candidate, regardless of how
+    many rules the policy has. Among matching rules the first in file order
+    wins, deny or allow; if none match, `default` decides.
+    """
+
+    def __init__(self, spec: dict):
+        if not isinstance(spec, dict):
+            raise PolicyError("Policy must be a JSON object")
+        default = spec.get('default', 'allow')
+        if default not in ('allow', 'deny'):
+            raise PolicyError("default must be 'allow' or 'deny'")
+        self.default_allow = default == 'allow'
+
+        self.rules = [Rule(rule, order) for order, rule in enumerate(spec.get('rules', []))]
+        ids = [rule.id for rule in self.rules]
+        if len(ids) != len(set(ids)):
+            raise PolicyError("Rule ids must be unique")
+
+        try:
+            # Daily spend limit in wei per sponsor; sponsors not listed are unlimited
+            self.budgets = {str(k): int(v) for k, v in spec.get('budgets', {}).items()}
+        except (AttributeError, TypeError, ValueError) as e:
+            raise PolicyError(f"Invalid budgets: {e}")
+
+        self._index = {}
+        for rule in self.rules:
+            for target in rule.targets or (WILDCARD,):
+                for selector in rule.selectors or (WILDCARD,):
+                    for sender in rule.senders or (WILDCARD,):
+                        self._index.setdefault((target, selector, sender), []).append(rule)
+
+    def evaluate(self, request: ForwardRequest) -> Decision:
+        sender = request.sender.lower()
+        target = request.to.lower()
+        selector = request.selector or WILDCARD
+        value = request.value
+        gas = request.gas
+
+        best = None
+        for t in (target, WILDCARD):
+            for s in (selector, WILDCARD):
+                for a in (sender, WILDCARD):
+                    best = self._first_match(self._index.get((t, s, a), ()), best, value, gas)
+
+        if best is None:
+            # Unmatched traffic is billed to the contract it calls
+            return Decision(self.default_allow, None, target, None)
+        return Decision(best.allow, best.id, best.sponsor, best.tier)
+
+    @staticmethod
+    def _first_match(bucket: list, best: Rule, value: int, gas: int) -> Rule:
+        # Every rule in a bucket matches the request's keys; buckets are in
+        # file order, so the first one within its limits is the bucket's best
+        for rule in bucket:
+            if best is not None and rule.order >= best.order:
+                break
+            if rule.allow and not rule.within_limits(value, gas):
+                continue
+            return rule
+        return best
+
+
+class PolicyStore:
+    """
+    Holds the active CompiledPolicy and reloads it when the policy file
+    changes, checking the file's mtime at most every `check_interval`
+    seconds. A file that fails to parse is reported and the previous policy
+    stays in force. Without a file, every request is allowed.
+    """
+
+    def __init__(self, path: str = None, check_interval: float = 1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.hits = Counter()
+        self._policy = CompiledPolicy({})
+        self._mtime = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        if path:
+            self.reload()
+
+    @classmethod
+    def from_settings(cls):
+        config = getattr(settings, 'RELAYER_POLICY', {})
+        return cls(config.get('FILE'), config.get('CHECK_INTERVAL', 1.0))
+
+    @property
+    def policy(self) -> CompiledPolicy:
+        if self.path and time.monotonic() - self._checked_at >= self.check_interval:
+            self._maybe_reload()
+        return self._policy
+
+    def evaluate(self, request: ForwardRequest) -> Decision:
+        decision = self.policy.evaluate(request)
+        self.hits[decision.rule_id] += 1
+        return decision
+
+    def reload(self):
+        with self._lock:
+            self._checked_at = time.monotonic()
+            mtime = os.stat(self.path).st_mtime_ns
+            with open(self.path) as f:
+                self._policy = CompiledPolicy(json.load(f))
+            self._mtime = mtime
+            print(f"Sponsorship policy loaded: {len(self._policy.rules)} rules from {self.path}")
+
+    def _maybe_reload(self):
+        self._checked_at = time.monotonic()
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError as e:
+            print("Sponsorship policy file unavailable, keeping previous policy:", e)
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            self.reload()
+        except (OSError, ValueError) as e:
+            # Don't retry (and log) the same broken file on every check
+            self._mtime = mtime
+            print("Sponsorship policy reload failed, keeping previous policy:", e)
+
+    def stats(self) -> dict:
+        policy = self._policy
+        return {
+            'source': self.path,
+            'default': 'allow' if policy.default_allow else 'deny',
+            'rules': [
+                {'id': rule.id, 'action': 'allow' if rule.allow else 'deny', 'hits': self.hits[rule.id]}
+                for rule in policy.rules
+            ],
+            'defaultHits': self.hits[None],
+        }
+
+
+policy_store = PolicyStore.from_settings()
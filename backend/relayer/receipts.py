@@ -0,0 +1,160 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+from web3.exceptions import TransactionNotFound
+
+from .admission import admission
+from .ledger import spend_ledger
+from .models import RelayedTransaction
+from .persistence import write_buffer
+
+
+class ReceiptWatcher:
+    """
+    Polls receipts for the transactions this node broadcast, every
+    `poll_interval` seconds, and settles each one once it is mined: the
+    status and the gas used go to the write-behind buffer in one update,
+    the gas is booked to the sponsor's ledger and admission control hears
+    of the confirmation. Settling on the sending node means limits and
+    budgets track real inclusion whether or not, or on which node, clients
+    poll the status endpoint. A transaction still unmined after `timeout`
+    seconds is marked 'dropped'.
+
+    A stored `gas_used` marks a row as billed. Every `sweep_interval`
+    seconds the watcher also settles unbilled rows sent with the keys this
+    node holds that no watcher can still be tracking (older than `timeout`),
+    e.g. those of a node that died before their receipts arrived.
+    """
+
+    def __init__(self, w3, held_keys, poll_interval: float = 2, timeout: float = 600,
+                 sweep_interval: float = 60, sweep_limit: int = 500):
+        self.w3 = w3
+        self.held_keys = held_keys
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.sweep_interval = sweep_interval
+        self.sweep_limit = sweep_limit
+
+        self._lock = threading.Lock()
+        self._watched = {}   # tx_hash -> (broadcast at (monotonic), sponsor)
+        self._thread = None
+        self._swept_at = time.monotonic()
+        self._settled = 0
+
+    @classmethod
+    def from_settings(cls, w3, held_keys):
+        config = getattr(settings, 'RELAYER_ADMISSION', {})
+        return cls(
+            w3,
+            held_keys,
+            poll_interval=config.get('RECEIPT_POLL_INTERVAL', 2),
+            timeout=config.get('INFLIGHT_TIMEOUT', 600),
+            sweep_interval=getattr(settings, 'RELAYER_LEDGER', {}).get('SWEEP_INTERVAL', 60),
+        )
+
+    def watch(self, tx_hash: str, sponsor: str):
+        with self._lock:
+            self._watched[tx_hash] = (time.monotonic(), sponsor)
+            self._ensure_started()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'watched': len(self._watched), 'settled': self._settled}
+
+    def poll_once(self) -> int:
+        """Check every watched transaction once. Returns how many settled."""
+        now = time.monotonic()
+        with self._lock:
+            watched = list(self._watched.items())
+
+        settled = 0
+        for tx_hash, (since, sponsor) in watched:
+            receipt = self._receipt(tx_hash)
+            if receipt is False:
+                continue
+            if receipt is None:
+                if now - since > self.timeout:
+                    with self._lock:
+                        given_up = self._watched.pop(tx_hash, None) is not None
+                    if given_up:
+                        # Stops it counting as in flight; sweep() still
+                        # settles it if it is mined after all
+                        write_buffer.set_status(tx_hash, 'dropped')
+                continue
+            with self._lock:
+                if self._watched.pop(tx_hash, None) is None:
+                    continue
+            self._settle(tx_hash, sponsor, receipt)
+            admission.confirmed(tx_hash)
+            settled += 1
+        return settled
+
+    def sweep(self) -> int:
+        """Settle unbilled rows of the keys this node holds. Returns how many settled."""
+        self._swept_at = time.monotonic()
+        held = self.held_keys()
+        if not held:
+            return 0
+        # Billing markers queued by poll_once() must be visible to the query
+        write_buffer.flush()
+        now = timezone.now()
+        rows = (
+            RelayedTransaction.objects
+            .filter(relayer__in=held, gas_used__isnull=True, tx_hash__isnull=False,
+                    created_at__lt=now - timedelta(seconds=self.timeout),
+                    created_at__gte=now - timedelta(days=1))
+            .exclude(status__in=RelayedTransaction.UNSENT_STATUSES)
+            .order_by('created_at')
+            .only('tx_hash', 'sponsor', 'to_address')[:self.sweep_limit]
+        )
+        with self._lock:
+            watched = set(self._watched)
+        settled = 0
+        for row in rows:
+            if row.tx_hash in watched:
+                continue
+            receipt = self._receipt(row.tx_hash)
+            if receipt:
+                self._settle(row.tx_hash, row.sponsor or row.to_address.lower(), receipt)
+                settled += 1
+        return settled
+
+    def _receipt(self, tx_hash: str):
+        # None while pending, False if the node couldn't be asked
+        try:
+            return self.w3.eth.get_transaction_receipt(tx_hash)
+        except TransactionNotFound:
+            return None
+        except Exception as e:
+            print(f"Receipt check for {tx_hash} failed:", e)
+            return False
+
+    def _settle(self, tx_hash: str, sponsor: str, receipt):
+        status = 'success' if receipt['status'] == 1 else 'failed'
+        # Reverted transactions still cost gas
+        write_buffer.set_status(tx_hash, status, gas_used=receipt['gasUsed'])
+        spend_ledger.record(sponsor, receipt['gasUsed'], receipt.get('effectiveGasPrice', 0))
+        with self._lock:
+            self._settled += 1
+
+    def _ensure_started(self):
+        # Caller holds self._lock
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='relayer-receipts', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                self.poll_once()
+                if time.monotonic() - self._swept_at >= self.sweep_interval:
+                    self.sweep()
+            except Exception as e:
+                print("Receipt polling failed:", e)
+            finally:
+                close_old_connections()
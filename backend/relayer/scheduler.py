@@ -0,0 +1,193 @@
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+
+
+class RequestExpired(Exception):
+    """The request's deadline is too close for it to be included in time."""
+
+
+class QueueFull(Exception):
+    pass
+
+
+class JobCancelled(Exception):
+    """The submitter gave up on the job before it was sent."""
+
+
+class RelayJob:
+    __slots__ = ('tier', 'deadline', 'fn', 'future', 'cancelled')
+
+    def __init__(self, tier: str, deadline: int, fn):
+        self.tier = tier
+        self.deadline = deadline
+        self.fn = fn
+        self.future = Future()
+        self.cancelled = threading.Event()
+
+    def cancel(self) -> bool:
+        """
+        Withdraw the job. Returns False if it may already have been sent;
+        a job that is running checks `cancelled` before broadcasting.
+        """
+        self.cancelled.set()
+        return self.future.cancel()
+
+
+class RelayScheduler:
+    """
+    Dispatches relays earliest-deadline-first within sponsor priority tiers.
+
+    Every tier has its own queue and its own worker threads, so bulk traffic
+    can never occupy the workers reserved for a higher tier. An idle worker
+    helps the other tiers, highest first.
+
+    A job leaves its queue only once `acquire(share)` has reserved an
+    admission slot for it, and `fn(job, slot)` then sends right away, so no
+    worker sits on a job waiting for capacity. Each tier below the first
+    may fill `headroom` less of the admission limits than the tier above
+    it, which keeps slots free for urgent relays while bulk traffic is
+    backed up. Jobs whose deadline falls within the currently observed
+    inclusion latency are failed with RequestExpired instead of being sent,
+    since they would revert after paying for gas.
+    """
+
+    # Seconds between admission checks while jobs are queued
+    RETRY_INTERVAL = 0.25
+
+    def __init__(self, tiers: dict, default_tier: str, queue_limit: int = 1000, latency=lambda: 0.0,
+                 acquire=lambda share: True, release=lambda slot: None, headroom: float = 0.25):
+        self.tiers = list(tiers)  # highest priority first
+        self.workers = dict(tiers)
+        self.default_tier = default_tier
+        self.queue_limit = queue_limit
+        self.latency = latency
+        self.acquire = acquire
+        self.release = release
+        # Fraction of the admission limits each tier may fill
+        self.shares = {tier: max(headroom, 1 - headroom * rank) for rank, tier in enumerate(self.tiers)}
+
+        self._queues = {tier: [] for tier in self.tiers}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._dropped = 0
+        self._started = False
+
+    @classmethod
+    def from_settings(cls, latency, acquire, release):
+        config = getattr(settings, 'RELAYER_SCHEDULER', {})
+        return cls(
+            tiers=config.get('TIERS', {'priority': 2, 'standard': 2, 'bulk': 1}),
+            default_tier=config.get('DEFAULT_TIER', 'standard'),
+            queue_limit=config.get('QUEUE_LIMIT', 1000),
+            latency=latency,
+            acquire=acquire,
+            release=release,
+            headroom=config.get('HEADROOM', 0.25),
+        )
+
+    def submit(self, tier: str, deadline: int, fn) -> RelayJob:
+        """
+        Queue `fn(job, slot)` to run on a worker once an admission slot is
+        reserved; `fn` owns the slot from then on. Raises RequestExpired if
+        the deadline is already out of reach and QueueFull if the tier's
+        queue is at its limit.
+        """
+        if tier not in self._queues:
+            tier = self.default_tier
+        if not self._feasible(deadline, time.time()):
+            raise RequestExpired("Request would expire before it could be included")
+
+        job = RelayJob(tier, deadline, fn)
+        with self._cond:
+            self._ensure_started()
+            queue = self._queues[tier]
+            if len(queue) >= self.queue_limit:
+                raise QueueFull(f"{tier} queue is full")
+            heapq.heappush(queue, (deadline, next(self._seq), job))
+            self._cond.notify()
+        return job
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                'queued': {tier: len(queue) for tier, queue in self._queues.items()},
+                'workers': self.workers,
+                'shares': self.shares,
+                'dropped': self._dropped,
+            }
+
+    def _feasible(self, deadline: int, now: float) -> bool:
+        return deadline - now >= self.latency()
+
+    def _ensure_started(self):
+        # Caller holds self._cond
+        if self._started:
+            return
+        self._started = True
+        for tier in self.tiers:
+            for i in range(self.workers[tier]):
+                threading.Thread(
+                    target=self._run, args=(tier,), name=f'relayer-{tier}-{i}', daemon=True
+                ).start()
+
+    def _next(self, own_tier: str):
+        # Caller holds self._cond. Pops the first job, own tier first and
+        # then highest first, that an admission slot can be reserved for.
+        refused = None
+        for tier in [own_tier] + self.tiers:
+            queue = self._queues[tier]
+            self._drop_dead(queue)
+            if not queue:
+                continue
+            share = self.shares[tier]
+            if refused is not None and share <= refused:
+                # A larger share was just refused, so this one will be too
+                continue
+            slot = self.acquire(share)
+            if not slot:
+                refused = share
+                continue
+            _, _, job = heapq.heappop(queue)
+            return job, slot
+        return None
+
+    def _drop_dead(self, queue: list):
+        # Caller holds self._cond. Clears withdrawn and expired jobs off the
+        # head of the queue, so they neither take a slot nor block others.
+        now = time.time()
+        while queue:
+            job = queue[0][2]
+            if job.future.cancelled():
+                heapq.heappop(queue)
+            elif not self._feasible(job.deadline, now):
+                heapq.heappop(queue)
+                # Moving it to running first makes this safe against a concurrent cancel()
+                if job.future.set_running_or_notify_cancel():
+                    self._dropped += 1
+                    job.future.set_exception(RequestExpired("Request expired while queued"))
+            else:
+                return
+
+    def _run(self, tier: str):
+        while True:
+            with self._cond:
+                picked = self._next(tier)
+                while picked is None:
+                    # With jobs still queued admission is full; recheck soon
+                    backlog = any(self._queues.values())
+                    self._cond.wait(self.RETRY_INTERVAL if backlog else None)
+                    picked = self._next(tier)
+            job, slot = picked
+
+            if not job.future.set_running_or_notify_cancel():
+                self.release(slot)
+                continue
+            try:
+                job.future.set_result(job.fn(job, slot))
+            except Exception as e:
+                job.future.set_exception(e)
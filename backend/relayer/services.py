@@ -306,11 +306,16 @@
 
 import os
 import time
+from collections import namedtuple
 from web3 import Web3
+from web3.exceptions import TransactionNotFound
 from dotenv import load_dotenv
 from eth_account import Account
 from eth_account.messages import encode_typed_data
 
+from .forward_request import ForwardRequest
+from .leasing import KeyLeaseManager
+
 
 
 encode_eip712 = encode_typed_data if 'encode_typed_data' in globals() else encode_structured_data
@@ -318,6 +323,68 @@ encode_eip712 = encode_typed_data if 'encode_typed_data' in globals() else encod
 
 load_dotenv()
 
+
+FORWARD_REQUEST_TYPES = {
+    "EIP712Domain": [
+        {"name": "name", "type": "string"},
+        {"name": "version", "type": "string"},
+        {"name": "chainId", "type": "uint256"},
+        {"name": "verifyingContract", "type": "address"}
+    ],
+    "ForwardRequest": [
+        {"name": "from", "type": "address"},
+        {"name": "to", "type": "address"},
+        {"name": "value", "type": "uint256"},
+        {"name": "gas", "type": "uint256"},
+        {"name": "nonce", "type": "uint256"},
+        {"name": "deadline", "type": "uint256"},
+        {"name": "data", "type": "bytes"}
+    ]
+}
+
+FORWARDER_DOMAIN = {
+    "name": "TrustedForwarder",
+    "version": "1",
+    "chainId": 11155111,
+    "verifyingContract": "0xA7ab9c7f337574C8560f715085a53c62b275EfBf"
+}
+
+SentTransaction = namedtuple('SentTransaction', ['tx_hash', 'relayer', 'nonce'])
+
+# Minimal ABI for the forwarder contract's `execute` and `nonces` functions
+FORWARDER_ABI = [
+    {
+        "inputs": [
+            {
+                "components": [
+                    {"name": "from", "type": "address"},
+                    {"name": "to", "type": "address"},
+                    {"name": "value", "type": "uint256"},
+                    {"name": "gas", "type": "uint256"},
+                    {"name": "nonce", "type": "uint256"},
+                    {"name": "deadline", "type": "uint48"},
+                    {"name": "data", "type": "bytes"},
+                ],
+                "name": "req",
+                "type": "tuple",
+            },
+            {"name": "signature", "type": "bytes"},
+        ],
+        "name": "execute",
+        "outputs": [{"name": "", "type": "bool"}],
+        "stateMutability": "nonpayable",
+        "type": "function",
+    },
+    {
+        "inputs": [{"name": "owner", "type": "address"}],
+        "name": "nonces",
+        "outputs": [{"name": "", "type": "uint256"}],
+        "stateMutability": "view",
+        "type": "function",
+    },
+]
+
+
 class RelayerService:
     def __init__(self):
         alchemy_url = os.getenv('RPC_URL')
@@ -328,20 +395,17 @@ class RelayerService:
         if not self.w3.is_connected():
             raise ValueError("Failed to connect to Web3 provider")
 
-        private_key = os.getenv('RELAYER_PRIVATE_KEY')
-        if not private_key:
+        # RELAYER_PRIVATE_KEYS (comma separated) lets several nodes share a
+        # pool of keys; each node sends with the ones it holds a lease on
+        private_keys = os.getenv('RELAYER_PRIVATE_KEYS') or os.getenv('RELAYER_PRIVATE_KEY')
+        if not private_keys:
             raise ValueError("RELAYER_PRIVATE_KEY not set in .env")
-        
-        private_key = private_key.strip()
-        if not private_key.startswith('0x'):
-            private_key = '0x' + private_key
-        
-        if len(private_key) != 66 or not all(c in '0123456789abcdefABCDEFx' for c in private_key[2:]):
-            raise ValueError(f"Invalid private key: {private_key[:10]}... (must be 64 hex chars + 0x)")
 
-        self.relayer_key = private_key
-        self.relayer_account = Account.from_key(self.relayer_key)
-        print(f"Relayer loaded: {self.relayer_account.address}")
+        self.relayer_accounts = {}
+        for private_key in private_keys.split(','):
+            account = Account.from_key(_check_private_key(private_key))
+            self.relayer_accounts[account.address] = account
+            print(f"Relayer loaded: {account.address}")
 
         self.forwarder_address = os.getenv('FORWARDER_ADDRESS')
         if not self.forwarder_address:
@@ -349,16 +413,15 @@ class RelayerService:
 
         self.chain_id = int(os.getenv('CHAIN_ID', 11155111))
 
-    def get_nonce(self, address: str) -> int:
-        # Simple in-memory cache; replace with DB query in production
-        if not hasattr(self, '_nonce_cache'):
-            self._nonce_cache = {}
-        self._nonce_cache[address] = self._nonce_cache.get(address, 0)
-        nonce = self._nonce_cache[address]
-        self._nonce_cache[address] += 1
-        return nonce
-
+        self.key_leases = KeyLeaseManager.from_settings(
+            list(self.relayer_accounts),
+            chain_nonce=lambda address: self.w3.eth.get_transaction_count(address, 'pending'),
+            fill_nonce=self.fill_nonce,
+        )
 
+    def get_nonce(self, address: str) -> int:
+        """The forwarder's next unused nonce for `address`, as of the latest block."""
+        return self.forwarder.functions.nonces(Web3.to_checksum_address(address)).call()
 
     # def verify_signature(self, forward_request: dict, signature: str) -> bool:
     #     try:
@@ -392,115 +455,90 @@ class RelayerService:
     #     except Exception as e:
     #         print("Sig verify error:", e)
     #         return False
-    def verify_signature(self, forward_request: dict, signature: str) -> bool:
+    def verify_signature(self, forward_request: ForwardRequest, signature: bytes) -> bool:
         try:
-            from eth_account.messages import encode_typed_data
-            from eth_account import Account
-            
-            # Ensure all numeric values are integers, not strings
-            message = {
-                "from": forward_request["from"],
-                "to": forward_request["to"],
-                "value": int(forward_request["value"]),
-                "gas": int(forward_request["gas"]),
-                "nonce": int(forward_request["nonce"]),
-                "deadline": int(forward_request["deadline"]),
-                "data": forward_request["data"]
-            }
-            
             full_message = {
-                "types": {
-                    "EIP712Domain": [
-                        {"name": "name", "type": "string"},
-                        {"name": "version", "type": "string"},
-                        {"name": "chainId", "type": "uint256"},
-                        {"name": "verifyingContract", "type": "address"}
-                    ],
-                    "ForwardRequest": [
-                        {"name": "from", "type": "address"},
-                        {"name": "to", "type": "address"},
-                        {"name": "value", "type": "uint256"},
-                        {"name": "gas", "type": "uint256"},
-                        {"name": "nonce", "type": "uint256"},
-                        {"name": 'deadline', "type": "uint256"},
-                        {"name": "data", "type": "bytes"}
-                    ]
-                },
+                "types": FORWARD_REQUEST_TYPES,
                 "primaryType": "ForwardRequest",
-                "domain": {
-                    "name": "TrustedForwarder",
-                    "version": "1",
-                    "chainId": 11155111,
-                    "verifyingContract": "0xA7ab9c7f337574C8560f715085a53c62b275EfBf"
-                },
-                "message": message
+                "domain": FORWARDER_DOMAIN,
+                "message": forward_request.as_message()
             }
             
-            print("Verifying with message:", message)
-            
             signable_message = encode_typed_data(full_message=full_message)
             recovered = Account.recover_message(signable_message, signature=signature)
-            
-            print(f"Recovered address: {recovered}")
-            print(f"Expected address: {forward_request['from']}")
-            
-            return recovered.lower() == forward_request["from"].lower()
+            return recovered == forward_request.sender
             
         except Exception as e:
             print("Signature verification failed:", e)
-            import traceback
-            traceback.print_exc()
             return False
-    def relay_transaction(self, request: dict, signature: str) -> str:
-        # Minimal ABI for the forwarder contract's `execute` function
-        forwarder_abi = [
-            {
-                "inputs": [
-                    {
-                        "components": [
-                            {"name": "from", "type": "address"},
-                            {"name": "to", "type": "address"},
-                            {"name": "value", "type": "uint256"},
-                            {"name": "gas", "type": "uint256"},
-                            {"name": "nonce", "type": "uint256"},
-                            {"name": "deadline", "type": "uint48"},
-                            {"name": "data", "type": "bytes"},
-                        ],
-                        "name": "req",
-                        "type": "tuple",
-                    },
-                    {"name": "signature", "type": "bytes"},
-                ],
-                "name": "execute",
-                "outputs": [{"name": "", "type": "bool"}],
-                "stateMutability": "nonpayable",
-                "type": "function",
-            }
-        ]
-
-        forwarder = self.w3.eth.contract(address=self.forwarder_address, abi=forwarder_abi)
-
-        # Build the request tuple
-        req = (
-            request['from'],
-            request['to'],
-            int(request['value']),
-            int(request['gas']),
-            int(request['nonce']),
-            int(request['deadline']),
-            request['data'],
-        )
 
-        # Build and sign the transaction
-        tx = forwarder.functions.execute(req, signature).build_transaction({
-            'from': self.relayer_account.address,
-            'gas': 500000,
-            'maxFeePerGas': self.w3.to_wei(50, 'gwei'),  # For EIP-1559
-            'maxPriorityFeePerGas': self.w3.to_wei(2, 'gwei'),
-            'nonce': self.w3.eth.get_transaction_count(self.relayer_account.address),
+    @property
+    def forwarder(self):
+        # Built once; constructing the contract object parses the ABI
+        if not hasattr(self, '_forwarder'):
+            self._forwarder = self.w3.eth.contract(address=self.forwarder_address, abi=FORWARDER_ABI)
+        return self._forwarder
+
+    def relay_transaction(self, request: ForwardRequest, signature: bytes, relayer: str,
+                          before_send=None) -> SentTransaction:
+        """
+        Sign and broadcast execute(request, signature) from `relayer`, which
+        must be a key this node holds a lease on. `before_send(tx_hash,
+        nonce)` runs between signing and broadcasting; if it raises, the
+        transaction is not sent.
+        """
+        nonce = self.key_leases.next_nonce(relayer)
+        try:
+            # Build and sign the transaction
+            tx = self.forwarder.functions.execute(request.as_tuple(), signature).build_transaction({
+                'from': relayer,
+                'gas': 500000,
+                **self._fees(),
+                'nonce': nonce,
+                'chainId': self.chain_id,
+            })
+            signed_tx = self.relayer_accounts[relayer].sign_transaction(tx)
+
+            if before_send is not None:
+                before_send(signed_tx.hash.hex(), nonce)
+            tx_hash = self.w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+        except Exception:
+            # The nonce is now a gap in front of every later send from this key
+            self.key_leases.skip(relayer, nonce)
+            raise
+        return SentTransaction(tx_hash.hex(), relayer, nonce)
+
+    def fill_nonce(self, relayer: str, nonce: int) -> str:
+        """Broadcast a zero-value transfer from `relayer` to itself to use up `nonce`."""
+        signed_tx = self.relayer_accounts[relayer].sign_transaction({
+            'to': relayer,
+            'value': 0,
+            'gas': 21000,
+            **self._fees(),
+            'nonce': nonce,
             'chainId': self.chain_id,
         })
+        return self.w3.eth.send_raw_transaction(signed_tx.raw_transaction).hex()
+
+    def _fees(self) -> dict:
+        return {
+            'maxFeePerGas': self.w3.to_wei(50, 'gwei'),  # For EIP-1559
+            'maxPriorityFeePerGas': self.w3.to_wei(2, 'gwei'),
+        }
+
+    def is_broadcast(self, tx_hash: str) -> bool:
+        try:
+            self.w3.eth.get_transaction(tx_hash)
+            return True
+        except TransactionNotFound:
+            return False
+
+
+def _check_private_key(private_key: str) -> str:
+    private_key = private_key.strip()
+    if not private_key.startswith('0x'):
+        private_key = '0x' + private_key
 
-        signed_tx = self.w3.eth.account.sign_transaction(tx, self.relayer_key)
-        tx_hash = self.w3.eth.send_raw_transaction(signed_tx.raw_transaction)
-        return tx_hash.hex()
\ No newline at end of file
+    if len(private_key) != 66 or not all(c in '0123456789abcdefABCDEFx' for c in private_key[2:]):
+        raise ValueError(f"Invalid private key: {private_key[:10]}... (must be 64 hex chars + 0x)")
+    return private_key
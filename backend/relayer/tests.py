@@ -1,3 +1,1098 @@
-from django.test import TestCase
+"""
+System checks import the views, which connect to RPC_URL, so run these
+against the fake node:
 
-# Create your tests here.
+    python manage.py fake_rpc &
+    RPC_URL=http://127.0.0.1:8545 python manage.py test relayer
+"""
+import io
+import json
+import os
+import tempfile
+import time
+import zlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+
+from django.core.management import call_command
+from eth_abi import encode
+from eth_account import Account
+from eth_account.messages import encode_typed_data
+from django.db import DatabaseError, connection
+from rest_framework.exceptions import ParseError
+from web3.exceptions import TransactionNotFound
+from django.test import RequestFactory, SimpleTestCase, TransactionTestCase
+from django.utils import timezone
+
+from .admission import AdmissionController
+from .cache import StatusCache, cached_response
+from .capture import TRACE_VERSION, TrafficRecorder, pseudonym, test_account
+from .fakenode import EXECUTE_SELECTOR, NONCES_SELECTOR, FakeNode
+from .forward_request import ForwardRequest, InvalidForwardRequest, parse_signature
+from .leasing import KeyLeaseManager, LeaseLost, WorkQueue
+from .management.commands.replay_traffic import Command as ReplayCommand, _Replay, _report
+from .models import ArchivedTransaction, Calldata, RelayedTransaction, RelayerKey
+from .pagination import decode_cursor, encode_cursor, keyset_page, parse_timestamp
+from .parsers import FastJSONParser
+from .persistence import WriteBehindBuffer
+from .policy import CompiledPolicy, PolicyError
+from .receipts import ReceiptWatcher
+from .scheduler import RelayScheduler, RequestExpired
+from .services import FORWARD_REQUEST_TYPES, FORWARDER_DOMAIN
+from .views import GetNonceView
+
+SENDER = '0x' + '11' * 20
+TARGET = '0x' + '22' * 20
+RELAYER = '0x' + '33' * 20
+
+
+def _tx_hash(n: int) -> str:
+    return '0x%064x' % n
+
+
+class AddressFieldTests(TransactionTestCase):
+    def test_round_trip_in_any_casing(self):
+        checksummed = '0x5FbDB2315678afecb367f032d93F642f64180aa3'
+        calldata = Calldata.from_bytes(b'')
+        calldata.save()
+        tx = RelayedTransaction.objects.create(
+            request_id=_tx_hash(1), from_address=checksummed.lower(), to_address=checksummed.upper().replace('0X', '0x'),
+            calldata=calldata, nonce=0,
+        )
+        stored = RelayedTransaction.objects.get(id=tx.id)
+        self.assertEqual((stored.from_address, stored.to_address), (checksummed, checksummed))
+        self.assertTrue(RelayedTransaction.objects.filter(from_address=checksummed.lower()).exists())
+        self.assertEqual(
+            RelayedTransaction.objects.filter(to_address=checksummed).values_list('to_address', flat=True)[0],
+            checksummed,
+        )
+        # Stored as the raw 20 bytes
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT from_address FROM relayed_transactions WHERE id = %s', [tx.id])
+            self.assertEqual(bytes(cursor.fetchone()[0]), bytes.fromhex(checksummed[2:]))
+
+
+class CalldataTests(TransactionTestCase):
+    def test_repetitive_calldata_is_compressed(self):
+        raw = bytes.fromhex('a9059cbb') + b'\x00' * 64
+        blob = Calldata.from_bytes(raw)
+        self.assertTrue(blob.compressed)
+        self.assertLess(len(blob.body), len(raw))
+        self.assertEqual(blob.to_bytes(), raw)
+
+    def test_short_calldata_is_kept_as_is(self):
+        blob = Calldata.from_hex('0x368b8772')
+        self.assertFalse(blob.compressed)
+        self.assertEqual(blob.to_hex(), '0x368b8772')
+
+    def test_identical_calldata_is_stored_once(self):
+        first, second = Calldata.from_hex('0x' + 'ab' * 100), Calldata.from_hex('ab' * 100)
+        self.assertEqual(first.hash, second.hash)
+        Calldata.objects.bulk_create([first], ignore_conflicts=True)
+        Calldata.objects.bulk_create([second], ignore_conflicts=True)
+        self.assertEqual(Calldata.objects.count(), 1)
+        self.assertEqual(Calldata.objects.get().to_hex(), '0x' + 'ab' * 100)
+
+
+class CompactTransactionsTests(TransactionTestCase):
+    def _row(self, n: int, calldata: Calldata, status: str, age_days: int):
+        return RelayedTransaction.objects.create(
+            request_id=_tx_hash(n), tx_hash=_tx_hash(n), from_address=SENDER, to_address=TARGET,
+            calldata=calldata, nonce=n, status=status, sponsor='acme', relayer=RELAYER,
+            relayer_nonce=n, gas_used=21000 + n, created_at=timezone.now() - timedelta(days=age_days),
+        )
+
+    def test_archives_old_final_rows_and_frees_unreferenced_blobs(self):
+        only_old, shared, fresh = (Calldata.from_hex('0x' + f'{n:02x}' * 40) for n in (1, 2, 3))
+        Calldata.objects.bulk_create([only_old, shared, fresh])
+        old = self._row(1, only_old, 'success', age_days=40)
+        self._row(2, shared, 'failed', age_days=40)
+        self._row(3, shared, 'success', age_days=1)        # too recent
+        self._row(4, fresh, 'submitted', age_days=40)      # not final yet
+
+        call_command('compact_transactions', days=30, batch_size=1, stdout=mock.Mock())
+
+        self.assertEqual(set(RelayedTransaction.objects.values_list('nonce', flat=True)), {3, 4})
+        self.assertEqual(Calldata.objects.count(), 2)
+        self.assertFalse(Calldata.objects.filter(hash=only_old.hash).exists())
+
+        archived = ArchivedTransaction.objects.get(original_id=old.id)
+        self.assertEqual(
+            (archived.tx_hash, archived.status, archived.sponsor, archived.relayer_nonce, archived.gas_used),
+            (_tx_hash(1), 'success', 'acme', 1, 21001),
+        )
+        self.assertEqual(archived.relayer.lower(), RELAYER)
+        self.assertEqual(archived.created_at, old.created_at)
+        self.assertEqual(zlib.decompress(bytes(archived.calldata)), only_old.to_bytes())
+        self.assertEqual(ArchivedTransaction.objects.count(), 2)
+
+
+class WriteBehindBufferTests(TransactionTestCase):
+    def setUp(self):
+        # No flusher thread; every test flushes explicitly
+        patcher = mock.patch.object(WriteBehindBuffer, '_ensure_started')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.buffer = WriteBehindBuffer(max_batch=100, max_delay=60)
+
+    def _add(self, n: int, **fields):
+        fields.setdefault('status', 'submitted')
+        return self.buffer.add(
+            request_id=_tx_hash(n), tx_hash=_tx_hash(n), from_address=SENDER,
+            to_address=TARGET, data='0x' + 'ab' * n, nonce=n, **fields
+        )
+
+    def test_flush_keeps_created_at(self):
+        accepted = timezone.now() - timedelta(seconds=5)
+        tx = self._add(1, created_at=accepted)
+        self.assertEqual(self.buffer.get(tx.tx_hash).created_at, accepted)
+
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(RelayedTransaction.objects.get(tx_hash=tx.tx_hash).created_at, accepted)
+
+    def test_created_at_defaults_to_acceptance_time(self):
+        tx = self._add(1)
+        self.buffer.flush()
+        self.assertEqual(RelayedTransaction.objects.get(tx_hash=tx.tx_hash).created_at, tx.created_at)
+
+    def test_status_before_flush_rides_on_insert(self):
+        tx = self._add(1)
+        self.buffer.set_status(tx.tx_hash, 'success')
+        self.assertEqual(self.buffer.pending(), 1)
+
+        self.buffer.flush()
+        self.assertEqual(RelayedTransaction.objects.get(tx_hash=tx.tx_hash).status, 'success')
+
+    def test_status_after_flush_is_an_update(self):
+        tx = self._add(1)
+        self.buffer.flush()
+        self.buffer.set_status(tx.tx_hash, 'failed')
+
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(RelayedTransaction.objects.get(tx_hash=tx.tx_hash).status, 'failed')
+
+    def test_status_update_keeps_billing_marker(self):
+        tx = self._add(1)
+        self.buffer.flush()
+        self.buffer.set_status(tx.tx_hash, 'success', gas_used=21000)
+        self.buffer.set_status(tx.tx_hash, 'success')
+        self.buffer.flush()
+        self.buffer.set_status(tx.tx_hash, 'success')
+        self.buffer.flush()
+        self.assertEqual(RelayedTransaction.objects.get(tx_hash=tx.tx_hash).gas_used, 21000)
+
+    def test_status_update_keeps_marker_committed_meanwhile(self):
+        tx = self._add(1)
+        self.buffer.flush()
+        self.buffer.set_status(tx.tx_hash, 'success')
+        bulk_update = RelayedTransaction.objects.bulk_update
+
+        def after_concurrent_bill(*args, **kwargs):
+            # Another node bills the row after this flush read it
+            RelayedTransaction.objects.filter(tx_hash=tx.tx_hash).update(gas_used=21000)
+            return bulk_update(*args, **kwargs)
+
+        with mock.patch.object(RelayedTransaction.objects, 'bulk_update', side_effect=after_concurrent_bill):
+            self.buffer.flush()
+        row = RelayedTransaction.objects.get(tx_hash=tx.tx_hash)
+        self.assertEqual((row.status, row.gas_used), ('success', 21000))
+
+    def test_failed_flush_requeues(self):
+        first = self._add(1)
+        with mock.patch.object(RelayedTransaction.objects, 'bulk_create', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self.buffer.flush()
+        self.assertFalse(RelayedTransaction.objects.exists())
+        self.assertEqual(self.buffer.pending(), 1)
+
+        second = self._add(2)
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(
+            set(RelayedTransaction.objects.values_list('tx_hash', flat=True)),
+            {first.tx_hash, second.tx_hash},
+        )
+
+    def test_next_nonce_covers_unflushed_rows(self):
+        self.assertIsNone(self.buffer.next_nonce(SENDER))
+        self._add(3)
+        self._add(4)
+        self.assertEqual(self.buffer.next_nonce(SENDER), 5)
+
+
+class GetNonceViewTests(TransactionTestCase):
+    def setUp(self):
+        self.chain_nonce = 0
+        patchers = [
+            mock.patch('relayer.views.relayer_service.get_nonce', side_effect=lambda address: self.chain_nonce),
+            mock.patch('relayer.views.write_buffer.next_nonce', return_value=None),
+            mock.patch('relayer.views.receipt_watcher.timeout', 600),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.calldata = Calldata.from_bytes(b'')
+        self.calldata.save()
+
+    def _row(self, nonce: int, status: str, age: float = 1, deadline: int = None):
+        RelayedTransaction.objects.create(
+            request_id=_tx_hash(nonce), tx_hash=_tx_hash(nonce), from_address=SENDER, to_address=TARGET,
+            calldata=self.calldata, nonce=nonce, status=status, deadline=deadline,
+            created_at=timezone.now() - timedelta(seconds=age),
+        )
+
+    def _nonce(self) -> int:
+        response = GetNonceView.as_view()(RequestFactory().get('/', {'address': SENDER}))
+        self.assertEqual(response.status_code, 200)
+        return response.data['nonce']
+
+    def test_counts_relays_in_flight(self):
+        self.chain_nonce = 2
+        self.assertEqual(self._nonce(), 2)
+        self._row(2, 'submitted', deadline=int(time.time()) + 60)
+        self._row(3, 'queued', age=3600)
+        self.assertEqual(self._nonce(), 4)
+
+    def test_ignores_relays_that_cannot_execute(self):
+        self.chain_nonce = 2
+        self._row(5, 'submitted', age=3600)                          # stale, e.g. its node died
+        self._row(6, 'dropped')
+        self._row(7, 'queued', deadline=int(time.time()) - 1)        # expired in the queue
+        self._row(8, 'submitted', deadline=int(time.time()) - 1)
+        self.assertEqual(self._nonce(), 2)
+
+
+class KeysetPaginationTests(TransactionTestCase):
+    def setUp(self):
+        calldata = Calldata.from_bytes(b'')
+        calldata.save()
+        base = timezone.now()
+        # Pairs of rows share a timestamp, so pages have to split ties by id
+        self.rows = [
+            RelayedTransaction.objects.create(
+                request_id=_tx_hash(n), tx_hash=_tx_hash(n), from_address=SENDER, to_address=TARGET,
+                calldata=calldata, nonce=n, created_at=base + timedelta(seconds=n // 2),
+            )
+            for n in range(7)
+        ]
+
+    def test_pages_cover_every_row_once_newest_first(self):
+        seen, cursor = [], None
+        while True:
+            rows, cursor = keyset_page(RelayedTransaction.objects.all(), cursor, limit=2)
+            seen.extend(row['id'] for row in rows)
+            if cursor is None:
+                break
+        expected = sorted(self.rows, key=lambda row: (row.created_at, row.id), reverse=True)
+        self.assertEqual(seen, [row.id for row in expected])
+
+    def test_cursor_round_trip(self):
+        row = self.rows[3]
+        self.assertEqual(decode_cursor(encode_cursor(row.created_at, row.id)), (row.created_at, row.id))
+
+    def test_invalid_cursor(self):
+        for cursor in ('not-a-cursor', encode_cursor(timezone.now(), 1)[:-3], 'OTk5OTk5OTk5OTk5OTk5OTk5OTk5LjE'):
+            with self.assertRaises(ValueError):
+                decode_cursor(cursor)
+
+    def test_parse_timestamp(self):
+        self.assertEqual(parse_timestamp('86400'), datetime(1970, 1, 2, tzinfo=dt_timezone.utc))
+        for value in ('soon', '1e20', '1' + '0' * 20, '-' + '9' * 20):
+            with self.assertRaises(ValueError):
+                parse_timestamp(value)
+
+
+class ForwardRequestParseTests(SimpleTestCase):
+    def _payload(self, **fields):
+        payload = {
+            'from': SENDER, 'to': TARGET, 'value': '0', 'gas': '100000',
+            'nonce': '7', 'deadline': '1700000000', 'data': '0xabcdef01',
+        }
+        payload.update(fields)
+        return payload
+
+    def test_parses_valid_request(self):
+        request = ForwardRequest.parse(self._payload(gas=100000))
+        self.assertEqual((request.gas, request.nonce, request.data), (100000, 7, bytes.fromhex('abcdef01')))
+        self.assertEqual(request.sender, '0x1111111111111111111111111111111111111111')
+        self.assertEqual(request.selector, '0xabcdef01')
+        self.assertEqual(ForwardRequest.parse(request.to_payload()), request)
+
+    def test_rejects_bad_addresses(self):
+        for value in (None, 17, '0xnope', SENDER[:-2], SENDER + '00', SENDER[2:] + '00', '0x' + 'zz' * 20):
+            with self.subTest(value=value), self.assertRaisesMessage(InvalidForwardRequest, 'to must be'):
+                ForwardRequest.parse(self._payload(to=value))
+
+    def test_rejects_bad_numbers(self):
+        for value in (True, 1.5, 1e3, None, [], '-1', -1, ' 7', '+7', '1_000', '0x10', '', '٣'):
+            with self.subTest(value=value), self.assertRaises(InvalidForwardRequest):
+                ForwardRequest.parse(self._payload(nonce=value))
+
+    def test_rejects_out_of_range_numbers(self):
+        ForwardRequest.parse(self._payload(value=str(2 ** 256 - 1), deadline=2 ** 48 - 1))
+        with self.assertRaisesMessage(InvalidForwardRequest, 'value is out of range'):
+            ForwardRequest.parse(self._payload(value=str(2 ** 256)))
+        with self.assertRaisesMessage(InvalidForwardRequest, 'deadline is out of range'):
+            ForwardRequest.parse(self._payload(deadline=2 ** 48))
+
+    def test_rejects_bad_calldata(self):
+        self.assertEqual(ForwardRequest.parse(self._payload(data='0x')).data, b'')
+        for value in ('abcd', '0xabc', '0xzz', 12, None):
+            with self.subTest(value=value), self.assertRaisesMessage(InvalidForwardRequest, 'data must be'):
+                ForwardRequest.parse(self._payload(data=value))
+
+    def test_rejects_non_objects(self):
+        for payload in (None, [], 'request'):
+            with self.subTest(payload=payload), self.assertRaises(InvalidForwardRequest):
+                ForwardRequest.parse(payload)
+
+    def test_parse_signature(self):
+        self.assertEqual(parse_signature('0x' + '11' * 65), b'\x11' * 65)
+        self.assertEqual(parse_signature('11' * 65), b'\x11' * 65)
+        for value in (None, 65, '0x' + '11' * 64, '0x' + '11' * 66, '0x' + 'zz' * 65, '0x' + '1' * 129):
+            with self.subTest(value=value), self.assertRaises(InvalidForwardRequest):
+                parse_signature(value)
+
+
+class FastJSONParserTests(SimpleTestCase):
+    def test_parses_json(self):
+        self.assertEqual(FastJSONParser().parse(io.BytesIO(b'{"a": [1, "b"]}')), {'a': [1, 'b']})
+
+    def test_invalid_json_is_a_parse_error(self):
+        for body in (b'{"a": ', b'', b'\xff\xfe', b"{'a': 1}"):
+            with self.subTest(body=body), self.assertRaises(ParseError):
+                FastJSONParser().parse(io.BytesIO(body))
+
+    def test_stdlib_fallback_raises_parse_error(self):
+        with mock.patch('relayer.parsers.orjson', None):
+            self.assertEqual(FastJSONParser().parse(io.BytesIO(b'[1]')), [1])
+            with self.assertRaises(ParseError):
+                FastJSONParser().parse(io.BytesIO(b'[1,'))
+
+
+class StatusCacheTests(SimpleTestCase):
+    def test_pending_entries_expire_after_ttl(self):
+        cache = StatusCache(pending_ttl=0.05)
+        cache.set(_tx_hash(1), {'status': 'submitted'}, final=False)
+        etag = cache.set(_tx_hash(2), {'status': 'success'}, final=True)
+        self.assertEqual(cache.get(_tx_hash(1))[2], False)
+        time.sleep(0.1)
+        self.assertIsNone(cache.get(_tx_hash(1)))
+        self.assertEqual(cache.get(_tx_hash(2)), ({'status': 'success'}, etag, True))
+
+    def test_evicts_least_recently_used(self):
+        cache = StatusCache(max_entries=2)
+        cache.set(_tx_hash(1), {'n': 1}, final=True)
+        cache.set(_tx_hash(2), {'n': 2}, final=True)
+        cache.get(_tx_hash(1))
+        cache.set(_tx_hash(3), {'n': 3}, final=True)
+        self.assertIsNone(cache.get(_tx_hash(2)))
+        self.assertIsNotNone(cache.get(_tx_hash(1)))
+        self.assertIsNotNone(cache.get(_tx_hash(3)))
+
+    def test_matching_etag_gets_304(self):
+        body = {'status': 'submitted'}
+        etag = StatusCache().set(_tx_hash(1), body, final=False)
+        self.assertTrue(etag.startswith('"'))
+
+        request = RequestFactory().get('/', HTTP_IF_NONE_MATCH=etag)
+        response = cached_response(request, body, etag, final=False, pending_ttl=2)
+        self.assertEqual(response.status_code, 304)
+        self.assertIsNone(response.data)
+        self.assertEqual(response['ETag'], etag)
+
+        request = RequestFactory().get('/', HTTP_IF_NONE_MATCH='"stale"')
+        response = cached_response(request, body, etag, final=False, pending_ttl=2)
+        self.assertEqual((response.status_code, response.data), (200, body))
+
+    def test_only_final_responses_are_immutable(self):
+        request = RequestFactory().get('/')
+        pending = cached_response(request, {'status': 'submitted'}, '"a"', final=False, pending_ttl=2)
+        self.assertNotIn('immutable', pending['Cache-Control'])
+        self.assertIn('max-age=2', pending['Cache-Control'])
+        self.assertIn('must-revalidate', pending['Cache-Control'])
+
+        final = cached_response(request, {'status': 'success'}, '"b"', final=True, pending_ttl=2)
+        self.assertIn('immutable', final['Cache-Control'])
+        self.assertNotIn('must-revalidate', final['Cache-Control'])
+
+
+class CompiledPolicyTests(SimpleTestCase):
+    SELECTOR = '0x368b8772'
+
+    def _request(self, sender=SENDER, to=TARGET, data=SELECTOR, value=0, gas=100000):
+        return ForwardRequest.parse({
+            'from': sender, 'to': to, 'value': str(value), 'gas': str(gas),
+            'nonce': '0', 'deadline': '0', 'data': data,
+        })
+
+    def test_first_matching_rule_in_file_order_wins(self):
+        policy = CompiledPolicy({'default': 'deny', 'rules': [
+            {'id': 'blocked', 'action': 'deny', 'senders': [SENDER]},
+            {'id': 'dapp', 'targets': [TARGET], 'selectors': [self.SELECTOR], 'sponsor': 'acme', 'tier': 'standard'},
+        ]})
+        self.assertEqual(policy.evaluate(self._request()), (False, 'blocked', 'blocked', None))
+        other = '0x' + '33' * 20
+        self.assertEqual(policy.evaluate(self._request(sender=other)), (True, 'dapp', 'acme', 'standard'))
+        self.assertEqual(policy.evaluate(self._request(sender=other, data='0x')), (False, None, TARGET.lower(), None))
+
+    def test_limits_fall_through_to_later_rules(self):
+        policy = CompiledPolicy({'default': 'deny', 'rules': [
+            {'id': 'small', 'targets': [TARGET], 'max_gas': 50000},
+            {'id': 'any-sender', 'senders': [SENDER]},
+        ]})
+        self.assertEqual(policy.evaluate(self._request(gas=10000)).rule_id, 'small')
+        self.assertEqual(policy.evaluate(self._request(gas=100000)).rule_id, 'any-sender')
+
+    def test_sender_rules_are_indexed(self):
+        senders = ['0x%040x' % n for n in range(1, 20001)]
+        policy = CompiledPolicy({'default': 'deny', 'rules': [
+            {'id': f"sender-{n}", 'senders': [sender]} for n, sender in enumerate(senders)
+        ]})
+        self.assertEqual(len(policy._index[('*', '*', senders[-1])]), 1)
+        self.assertEqual(policy.evaluate(self._request(sender=senders[-1])).rule_id, 'sender-19999')
+        self.assertFalse(policy.evaluate(self._request()).allowed)
+
+    def test_rejects_invalid_rules(self):
+        for spec in ({'rules': [{'action': 'maybe'}]}, {'rules': [{'selectors': ['0x12']}]},
+                     {'rules': [{'id': 'a'}, {'id': 'a'}]}, {'default': 'sometimes'}):
+            with self.assertRaises(PolicyError):
+                CompiledPolicy(spec)
+
+
+class AdmissionControllerTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('relayer.admission.time.monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.admission = AdmissionController(
+            initial_limit=8, min_limit=2, max_limit=10, global_limit=100,
+            target_latency=30, decrease=0.5, inflight_timeout=600,
+        )
+
+    def _send(self, n: int) -> str:
+        admitted, _ = self.admission.try_acquire(RELAYER)
+        self.assertTrue(admitted)
+        self.admission.submitted(RELAYER, _tx_hash(n))
+        return _tx_hash(n)
+
+    def _limit(self) -> float:
+        return self.admission._keys[RELAYER].limit
+
+    def test_caps_pending_transactions_at_the_limit(self):
+        for n in range(8):
+            self._send(n)
+        admitted, retry_after = self.admission.try_acquire(RELAYER)
+        self.assertFalse(admitted)
+        self.assertGreaterEqual(retry_after, 1)
+
+        self.admission.confirmed(_tx_hash(0))
+        self.assertTrue(self.admission.try_acquire(RELAYER)[0])
+        self.admission.release(RELAYER)
+        self.assertEqual(self.admission.stats()['inflight'], 7)
+
+    def test_fast_confirmations_grow_the_limit_additively(self):
+        self.admission.confirmed(self._send(1))
+        self.assertAlmostEqual(self._limit(), 8.125)
+        for n in range(2, 40):
+            self.admission.confirmed(self._send(n))
+        self.assertEqual(self._limit(), 10)
+
+    def test_slow_confirmations_cut_the_limit_once_per_window(self):
+        slow = [self._send(n) for n in range(3)]
+        self.now += 31
+        self.admission.confirmed(slow[0])
+        self.assertEqual(self._limit(), 4)
+        self.admission.confirmed(slow[1])
+        self.assertEqual(self._limit(), 4)
+
+        tx_hash = self._send(3)
+        self.now += 31
+        self.admission.confirmed(tx_hash)
+        self.assertEqual(self._limit(), 2)
+
+    def test_unconfirmed_transactions_expire_as_congestion(self):
+        self._send(1)
+        self.now += 601
+        self.assertTrue(self.admission.try_acquire(RELAYER)[0])
+        self.assertEqual(self._limit(), 4)
+        self.assertEqual(self.admission.stats()['inflight'], 1)
+
+    def test_share_keeps_slots_for_larger_shares(self):
+        for n in range(4):
+            self._send(n)
+        self.assertFalse(self.admission.try_acquire(RELAYER, share=0.5)[0])
+        self.assertTrue(self.admission.try_acquire(RELAYER, share=1.0)[0])
+
+    def test_global_limit(self):
+        self.admission.global_limit = 2
+        self.assertEqual(self.admission.acquire_any([RELAYER, SENDER])[0], RELAYER)
+        self.assertEqual(self.admission.acquire_any([RELAYER, SENDER])[0], RELAYER)
+        self.assertIsNone(self.admission.acquire_any([RELAYER, SENDER])[0])
+
+
+class ReceiptWatcherTests(TransactionTestCase):
+    def setUp(self):
+        self.receipts = {}
+        w3 = mock.Mock()
+        w3.eth.get_transaction_receipt.side_effect = self._receipt
+        self.watcher = ReceiptWatcher(w3, lambda: [RELAYER], timeout=600)
+        self.admission = mock.Mock()
+        self.ledger = mock.Mock()
+        with mock.patch.object(WriteBehindBuffer, '_ensure_started'):
+            self.buffer = WriteBehindBuffer()
+        patchers = [
+            mock.patch('relayer.receipts.admission', self.admission),
+            mock.patch('relayer.receipts.spend_ledger', self.ledger),
+            mock.patch('relayer.receipts.write_buffer', self.buffer),
+            mock.patch.object(ReceiptWatcher, '_ensure_started'),
+            mock.patch.object(WriteBehindBuffer, '_ensure_started'),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.calldata = Calldata.from_bytes(b'')
+        self.calldata.save()
+
+    def _receipt(self, tx_hash):
+        if tx_hash not in self.receipts:
+            raise TransactionNotFound(tx_hash)
+        return self.receipts[tx_hash]
+
+    def _mined(self, n: int, status: int = 1, gas_used: int = 50000):
+        self.receipts[_tx_hash(n)] = {'status': status, 'gasUsed': gas_used, 'effectiveGasPrice': 10}
+
+    def _row(self, n: int, age: float, relayer: str = RELAYER, **fields):
+        fields.setdefault('status', 'submitted')
+        return RelayedTransaction.objects.create(
+            request_id=_tx_hash(n), tx_hash=_tx_hash(n), from_address=SENDER, to_address=TARGET,
+            calldata=self.calldata, nonce=n, sponsor='acme', relayer=relayer,
+            created_at=timezone.now() - timedelta(seconds=age), **fields
+        )
+
+    def test_settles_and_bills_each_transaction_once(self):
+        self._row(1, age=1)
+        self._row(2, age=1)
+        self.watcher.watch(_tx_hash(1), 'acme')
+        self.watcher.watch(_tx_hash(2), 'acme')
+        self.assertEqual(self.watcher.poll_once(), 0)
+
+        self._mined(1)
+        self._mined(2, status=0, gas_used=30000)
+        self.assertEqual(self.watcher.poll_once(), 2)
+        self.assertEqual(self.watcher.poll_once(), 0)
+        self.buffer.flush()
+
+        rows = {row.tx_hash: row for row in RelayedTransaction.objects.all()}
+        self.assertEqual((rows[_tx_hash(1)].status, rows[_tx_hash(1)].gas_used), ('success', 50000))
+        self.assertEqual((rows[_tx_hash(2)].status, rows[_tx_hash(2)].gas_used), ('failed', 30000))
+        self.ledger.record.assert_has_calls([mock.call('acme', 50000, 10), mock.call('acme', 30000, 10)])
+        self.assertEqual(self.ledger.record.call_count, 2)
+        self.assertEqual(self.admission.confirmed.call_count, 2)
+        self.assertEqual(self.watcher.stats(), {'watched': 0, 'settled': 2})
+
+    def test_gives_up_after_timeout(self):
+        self._row(1, age=700)
+        with mock.patch('relayer.receipts.time.monotonic', return_value=0):
+            self.watcher.watch(_tx_hash(1), 'acme')
+        with mock.patch('relayer.receipts.time.monotonic', return_value=601):
+            self.watcher.poll_once()
+        self.assertEqual(self.watcher.stats()['watched'], 0)
+        self.admission.confirmed.assert_not_called()
+        self.ledger.record.assert_not_called()
+        self.buffer.flush()
+        self.assertEqual(RelayedTransaction.objects.get().status, 'dropped')
+
+        # Mined after all: the sweep still settles and bills it
+        self._mined(1)
+        self.assertEqual(self.watcher.sweep(), 1)
+        self.buffer.flush()
+        row = RelayedTransaction.objects.get()
+        self.assertEqual((row.status, row.gas_used), ('success', 50000))
+
+    def test_sweep_bills_what_no_watcher_settled(self):
+        self._row(1, age=700)                              # sender died before the receipt
+        self._row(2, age=700, gas_used=50000)              # already billed
+        self._row(3, age=700, relayer=SENDER)              # another node's key
+        self._row(4, age=10)                               # its sender may still be watching
+        self._row(5, age=700)                              # still watched here
+        self._row(6, age=700, status='success')            # status polled, never billed
+        self.watcher.watch(_tx_hash(5), 'acme')
+        for n in range(1, 7):
+            self._mined(n)
+
+        self.assertEqual(self.watcher.sweep(), 2)
+        self.buffer.flush()
+        billed = RelayedTransaction.objects.filter(gas_used__isnull=False)
+        self.assertEqual(set(billed.values_list('nonce', flat=True)), {1, 2, 6})
+        self.assertEqual(self.ledger.record.call_count, 2)
+
+        self.assertEqual(self.watcher.sweep(), 0)
+
+    def test_sweep_sees_markers_not_flushed_yet(self):
+        self._row(1, age=700)
+        self.watcher.watch(_tx_hash(1), 'acme')
+        self._mined(1)
+        self.watcher.poll_once()
+        self.assertEqual(self.watcher.sweep(), 0)
+        self.assertEqual(self.ledger.record.call_count, 1)
+
+
+class _Slots:
+    """Admission stand-in with `capacity` slots, of which a share below 1 may fill only part."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.used = 0
+
+    def acquire(self, share: float):
+        if self.used >= int(self.capacity * share):
+            return None
+        self.used += 1
+        return f"slot-{self.used}"
+
+    def release(self, slot):
+        self.used -= 1
+
+
+class RelaySchedulerTests(SimpleTestCase):
+    def setUp(self):
+        self.slots = _Slots(capacity=4)
+        self.scheduler = RelayScheduler(
+            {'priority': 1, 'standard': 1, 'bulk': 1}, 'standard', queue_limit=10,
+            acquire=self.slots.acquire, release=self.slots.release, headroom=0.25,
+        )
+        # Jobs are queued and picked by calling _next() directly, no workers
+        self.scheduler._started = True
+        self.deadline = int(time.time()) + 3600
+
+    def _submit(self, tier: str, deadline: int = None):
+        return self.scheduler.submit(tier, deadline or self.deadline, lambda job, slot: slot)
+
+    def _next(self, tier: str):
+        with self.scheduler._cond:
+            return self.scheduler._next(tier)
+
+    def test_lower_tiers_keep_headroom_for_higher_ones(self):
+        self.assertEqual(self.scheduler.shares, {'priority': 1.0, 'standard': 0.75, 'bulk': 0.5})
+        bulk = [self._submit('bulk') for _ in range(4)]
+        self.assertIs(self._next('bulk')[0], bulk[0])
+        self.assertIs(self._next('bulk')[0], bulk[1])
+        # Bulk may only fill half the slots; the rest stay queued, not held
+        self.assertIsNone(self._next('bulk'))
+        self.assertEqual(self.scheduler.stats()['queued']['bulk'], 2)
+
+        urgent = self._submit('priority')
+        job, slot = self._next('bulk')
+        self.assertIs(job, urgent)
+        self.assertEqual(slot, 'slot-3')
+
+    def test_slots_go_to_the_highest_tier_first(self):
+        self.slots.capacity = 1
+        self._submit('standard')
+        urgent = self._submit('priority')
+        self.assertIs(self._next('standard')[0], urgent)
+        self.assertIsNone(self._next('standard'))
+
+    def test_earliest_deadline_first_within_a_tier(self):
+        late = self._submit('standard', self.deadline + 60)
+        soon = self._submit('standard', self.deadline)
+        self.assertIs(self._next('standard')[0], soon)
+        self.assertIs(self._next('standard')[0], late)
+
+    def test_cancelled_jobs_take_no_slot(self):
+        job = self._submit('standard')
+        self.assertTrue(job.cancel())
+        self.assertIsNone(self._next('standard'))
+        self.assertEqual(self.slots.used, 0)
+
+    def test_jobs_expiring_in_the_queue_fail(self):
+        self.scheduler.latency = lambda: 60
+        job = self._submit('standard', int(time.time()) + 120)
+        self.scheduler.latency = lambda: 600
+        self.assertIsNone(self._next('standard'))
+        with self.assertRaises(RequestExpired):
+            job.future.result(timeout=0)
+        self.assertEqual(self.scheduler.stats()['dropped'], 1)
+        self.assertEqual(self.slots.used, 0)
+
+    def test_workers_wait_for_a_slot_without_taking_the_job(self):
+        slots = _Slots(capacity=0)
+        scheduler = RelayScheduler({'standard': 1}, 'standard', acquire=slots.acquire, release=slots.release)
+        scheduler.RETRY_INTERVAL = 0.01
+        job = scheduler.submit('standard', self.deadline, lambda job, slot: slot)
+        time.sleep(0.05)
+        self.assertFalse(job.future.running() or job.future.done())
+        self.assertEqual(scheduler.stats()['queued']['standard'], 1)
+
+        slots.capacity = 1
+        self.assertEqual(job.future.result(timeout=5), 'slot-1')
+
+
+class KeyLeaseManagerTests(TransactionTestCase):
+    def setUp(self):
+        self.chain = {RELAYER: 0}   # pending nonce per key
+        self.filled = []
+        self.fill_error = None
+
+    def _manager(self, node_id: str) -> KeyLeaseManager:
+        return KeyLeaseManager(node_id, [RELAYER], self.chain.get, self._fill, ttl=30)
+
+    def _fill(self, address: str, nonce: int):
+        if self.fill_error:
+            raise self.fill_error
+        self.filled.append(nonce)
+        self.chain[address] = max(self.chain[address], nonce + 1)
+
+    def _expire_lease(self):
+        RelayerKey.objects.filter(address=RELAYER).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+
+    def test_nonces_are_sequential_and_persisted(self):
+        self.chain[RELAYER] = 5
+        manager = self._manager('a')
+        manager.renew()
+        self.assertEqual([manager.next_nonce(RELAYER) for _ in range(3)], [5, 6, 7])
+        self.assertEqual(RelayerKey.objects.get(address=RELAYER).next_nonce, 8)
+        self.assertEqual(self.filled, [])
+
+    def test_one_owner_per_key(self):
+        first, second = self._manager('a'), self._manager('b')
+        first.renew()
+        second.renew()
+        self.assertEqual(RelayerKey.objects.get(address=RELAYER).owner, 'a')
+        with self.assertRaises(LeaseLost):
+            second.next_nonce(RELAYER)
+
+    def test_stalled_owner_is_fenced_off(self):
+        first, second = self._manager('a'), self._manager('b')
+        first.renew()
+        self.assertEqual(first.next_nonce(RELAYER), 0)
+
+        # `first` stalls past its lease and `second` takes over
+        self._expire_lease()
+        second.renew()
+        self.assertEqual(second.next_nonce(RELAYER), 1)
+        with self.assertRaises(LeaseLost):
+            first.next_nonce(RELAYER)
+        self.assertEqual(second.next_nonce(RELAYER), 2)
+
+    def test_takeover_fills_nonces_the_previous_owner_never_sent(self):
+        first = self._manager('a')
+        first.renew()
+        nonces = [first.next_nonce(RELAYER) for _ in range(4)]
+        # Only the first two reached the chain before `first` died
+        self.chain[RELAYER] = 2
+
+        self._expire_lease()
+        second = self._manager('b')
+        second.renew()
+        self.assertEqual(self.filled, [2, 3])
+        self.assertEqual(second.next_nonce(RELAYER), nonces[-1] + 1)
+
+    def test_relays_with_filled_nonces_are_dropped(self):
+        calldata = Calldata.from_bytes(b'')
+        calldata.save()
+        for n, status in enumerate(['success', 'submitted', 'submitted', 'sending']):
+            RelayedTransaction.objects.create(
+                request_id=_tx_hash(n), tx_hash=_tx_hash(n), from_address=SENDER, to_address=TARGET,
+                calldata=calldata, nonce=n, status=status, relayer=RELAYER, relayer_nonce=n,
+            )
+        manager = self._manager('a')
+        manager.renew()
+        manager.skip(RELAYER, 2)
+        manager.skip(RELAYER, 3)
+        self.assertEqual(
+            list(RelayedTransaction.objects.order_by('nonce').values_list('status', flat=True)),
+            # A 'sending' row is requeued by WorkQueue.recover instead
+            ['success', 'submitted', 'dropped', 'sending'],
+        )
+
+    def test_skipped_nonce_is_filled_not_reused(self):
+        manager = self._manager('a')
+        manager.renew()
+        self.assertEqual([manager.next_nonce(RELAYER) for _ in range(3)], [0, 1, 2])
+        manager.skip(RELAYER, 1)
+        self.assertEqual(self.filled, [1])
+        # Nonce 2 may already be on its way, so the sequence carries on
+        self.assertEqual(manager.next_nonce(RELAYER), 3)
+
+    def test_failed_fills_are_retried_on_renewal(self):
+        manager = self._manager('a')
+        manager.renew()
+        manager.next_nonce(RELAYER)
+        self.fill_error = ConnectionError('node down')
+        manager.skip(RELAYER, 0)
+        self.assertEqual(manager.stats()['gaps'], {RELAYER: [0]})
+
+        self.fill_error = None
+        manager.renew()
+        self.assertEqual(self.filled, [0])
+        self.assertEqual(manager.stats()['gaps'], {})
+
+    def test_fill_rejected_for_a_used_nonce_is_done(self):
+        manager = self._manager('a')
+        manager.renew()
+        manager.next_nonce(RELAYER)
+        # The send raised, but the transaction did get through
+        self.chain[RELAYER] = 1
+        self.fill_error = ValueError('nonce too low')
+        manager.skip(RELAYER, 0)
+        self.assertEqual(manager.stats()['gaps'], {})
+
+
+class WorkQueueTests(TransactionTestCase):
+    def setUp(self):
+        calldata = Calldata.from_bytes(b'')
+        calldata.save()
+        self.rows = [
+            RelayedTransaction.objects.create(
+                request_id=_tx_hash(n), from_address=SENDER, to_address=TARGET, calldata=calldata,
+                nonce=n, status='queued', payload={'request': {}, 'signature': '0x'},
+                created_at=timezone.now() + timedelta(milliseconds=n),
+            )
+            for n in range(5)
+        ]
+        self.first, self.second = WorkQueue('a', ttl=60), WorkQueue('b', ttl=60)
+
+    def _claims_are_exclusive(self):
+        claimed = self.first.claim(3)
+        self.assertEqual([row.nonce for row in claimed], [0, 1, 2])
+        self.assertTrue(all(row.lease_owner.startswith('a:') for row in claimed))
+
+        self.assertEqual([row.nonce for row in self.second.claim(10)], [3, 4])
+        self.assertEqual(self.first.claim(10), [])
+
+        # Expired leases are up for grabs again
+        RelayedTransaction.objects.filter(id=claimed[0].id).update(
+            lease_expires_at=timezone.now() - timedelta(seconds=1)
+        )
+        self.assertEqual([row.nonce for row in self.second.claim(10)], [0])
+
+    def test_claim_with_conditional_update(self):
+        with mock.patch.object(connection.features, 'has_select_for_update_skip_locked', False):
+            self._claims_are_exclusive()
+
+    def test_claim_with_skip_locked(self):
+        with mock.patch.object(connection.features, 'has_select_for_update_skip_locked', True):
+            self._claims_are_exclusive()
+
+    def test_mark_sending_needs_a_live_lease(self):
+        row = self.first.claim(1)[0]
+        self.assertTrue(self.first.mark_sending(row, _tx_hash(100), RELAYER, 7))
+        stored = RelayedTransaction.objects.get(id=row.id)
+        self.assertEqual((stored.status, stored.tx_hash, stored.relayer_nonce), ('sending', _tx_hash(100), 7))
+        self.assertEqual(stored.relayer.lower(), RELAYER)
+
+        # A stale claim on a row someone else re-claimed must not be sent
+        row = self.first.claim(1)[0]
+        RelayedTransaction.objects.filter(id=row.id).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.second.claim(1)[0].id, row.id)
+        self.assertFalse(self.first.mark_sending(row, _tx_hash(101), RELAYER, 8))
+
+    def test_finish_and_release(self):
+        sent, unsent = self.first.claim(2)
+        self.first.finish(sent, 'submitted')
+        self.first.release(unsent)
+        sent = RelayedTransaction.objects.get(id=sent.id)
+        self.assertEqual((sent.status, sent.payload, sent.lease_owner), ('submitted', None, ''))
+        self.assertEqual([row.id for row in self.second.claim(1)], [unsent.id])
+
+    def test_heartbeat_extends_only_own_queued_rows(self):
+        rows = self.first.claim(2)
+        RelayedTransaction.objects.filter(id=rows[0].id).update(lease_owner='b:other')
+        self.assertEqual(self.first.heartbeat(rows), 1)
+
+    def test_recover_abandoned_sends(self):
+        broadcast, unsent = self.first.claim(2)
+        self.first.mark_sending(broadcast, _tx_hash(100), RELAYER, 7)
+        self.first.mark_sending(unsent, _tx_hash(101), RELAYER, 8)
+        self.assertEqual(self.second.abandoned(), [])
+
+        # The sending node died; its leases run out
+        RelayedTransaction.objects.filter(status='sending').update(
+            lease_expires_at=timezone.now() - timedelta(seconds=1)
+        )
+        abandoned = {row.id: row for row in self.second.abandoned()}
+        self.assertEqual(set(abandoned), {broadcast.id, unsent.id})
+        self.assertTrue(self.second.recover(abandoned[broadcast.id], broadcast=True))
+        self.assertTrue(self.second.recover(abandoned[unsent.id], broadcast=False))
+        # Settling twice is a no-op
+        self.assertFalse(self.second.recover(abandoned[unsent.id], broadcast=False))
+
+        broadcast = RelayedTransaction.objects.get(id=broadcast.id)
+        self.assertEqual((broadcast.status, broadcast.tx_hash, broadcast.payload), ('submitted', _tx_hash(100), None))
+        self.assertEqual([row.id for row in self.second.claim(1)], [unsent.id])
+        self.assertIsNone(RelayedTransaction.objects.get(id=unsent.id).tx_hash)
+
+
+class TrafficRecorderTests(SimpleTestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.jsonl')
+        os.close(handle)
+        self.addCleanup(os.remove, self.path)
+        patcher = mock.patch.object(TrafficRecorder, '_ensure_started')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.request = {'from': SENDER, 'to': TARGET, 'value': '0', 'gas': '100000',
+                        'nonce': '3', 'deadline': '1700000600', 'data': '0x'}
+
+    def _lines(self) -> list:
+        with open(self.path) as trace:
+            return [json.loads(line) for line in trace]
+
+    def _record(self, recorder, endpoint: str, fields: dict, data=None, code: int = 200):
+        recorder.record(endpoint, 1700000000.1234, 0.0123, mock.Mock(status_code=code, data=data), fields)
+
+    def test_records_one_line_per_request(self):
+        recorder = TrafficRecorder(self.path)
+        payload = {'request': self.request, 'signature': '0x' + '11' * 65}
+        self._record(recorder, 'relay', {'payload': payload}, data={'txHash': _tx_hash(1)})
+        self._record(recorder, 'nonce', {'address': SENDER})
+        self._record(recorder, 'status', {'tx_hash': _tx_hash(1), 'conditional': True}, code=304)
+        self.assertEqual(recorder.flush(), 3)
+        self.assertEqual(recorder.flush(), 0)
+
+        relay, nonce, status = self._lines()
+        self.assertEqual(relay, {'v': TRACE_VERSION, 'e': 'relay', 't': 1700000000.123, 'ms': 12.3, 'c': 200,
+                                 's': payload['signature'], 'r': self.request, 'tx': _tx_hash(1)})
+        self.assertEqual(nonce['a'], SENDER)
+        self.assertEqual((status['ref'], status['inm'], status['c']), (_tx_hash(1), 1, 304))
+
+    def test_resign_replaces_senders_and_signatures(self):
+        recorder = TrafficRecorder(self.path, resign=True, salt='pepper')
+        self._record(recorder, 'relay', {'payload': {'request': self.request, 'signature': '0x11'}})
+        self._record(recorder, 'nonce', {'address': SENDER.upper().replace('0X', '0x')})
+        recorder.flush()
+
+        relay, nonce = self._lines()
+        self.assertNotIn('s', relay)
+        self.assertNotIn('from', relay['r'])
+        self.assertNotIn('deadline', relay['r'])
+        self.assertEqual(relay['r']['dl'], 600)
+        self.assertEqual(relay['k'], pseudonym(SENDER, 'pepper'))
+        self.assertEqual(nonce['k'], relay['k'])
+        self.assertNotEqual(pseudonym(SENDER, 'other'), relay['k'])
+        self.assertEqual(test_account(relay['k']).address, test_account(nonce['k']).address)
+
+    def test_unreadable_relay_payloads_are_recorded_without_request(self):
+        recorder = TrafficRecorder(self.path)
+        self._record(recorder, 'relay', {'payload': ['not', 'an', 'object']}, code=400)
+        recorder.flush()
+        self.assertNotIn('r', self._lines()[0])
+
+
+class ReplayTrafficTests(SimpleTestCase):
+    def _trace(self, *lines) -> str:
+        handle, path = tempfile.mkstemp(suffix='.jsonl')
+        with os.fdopen(handle, 'w') as trace:
+            trace.write(''.join((line if isinstance(line, str) else json.dumps(line)) + '\n' for line in lines))
+        self.addCleanup(os.remove, path)
+        return path
+
+    def _relay_entry(self, **request) -> dict:
+        fields = {'to': TARGET, 'value': '0', 'gas': '100000', 'nonce': '0', 'dl': 600, 'data': '0x'}
+        fields.update(request)
+        return {'v': TRACE_VERSION, 'e': 'relay', 't': 1.0, 'k': 'abc', 'r': fields}
+
+    def test_load_skips_malformed_lines(self):
+        stderr = io.StringIO()
+        path = self._trace(
+            {'v': TRACE_VERSION, 'e': 'nonce', 't': 2.0, 'a': SENDER},
+            '{"v": 1, "e": "relay"',                                    # truncated
+            '[1, 2]',
+            {'v': TRACE_VERSION, 'e': 'relay', 't': 3.0},               # request not recorded
+            {'v': TRACE_VERSION, 'e': 'status', 'ref': _tx_hash(1)},    # no timestamp
+            {'v': TRACE_VERSION + 1, 'e': 'nonce', 't': 0.5},
+            {'v': TRACE_VERSION, 'e': 'policy', 't': 0.5},
+            self._relay_entry(),
+        )
+        entries = ReplayCommand(stderr=stderr)._load(path)
+        self.assertEqual([entry['e'] for entry in entries], ['relay', 'nonce'])
+        self.assertIn('Skipped 4 malformed or unreplayable lines', stderr.getvalue())
+
+    def test_relay_is_resigned_with_the_pseudonyms_key(self):
+        body = _Replay('http://backend')._relay_body(self._relay_entry())
+        forward_request = ForwardRequest.parse(body['request'])
+        self.assertEqual(forward_request.sender, test_account('abc').address)
+        self.assertAlmostEqual(forward_request.deadline, time.time() + 600, delta=5)
+        signable = encode_typed_data(full_message={
+            'types': FORWARD_REQUEST_TYPES, 'primaryType': 'ForwardRequest',
+            'domain': FORWARDER_DOMAIN, 'message': forward_request.as_message(),
+        })
+        self.assertEqual(Account.recover_message(signable, signature=body['signature']), forward_request.sender)
+
+    def test_malformed_relay_is_replayed_as_is(self):
+        replay = _Replay('http://backend')
+        for entry in (self._relay_entry(to='0xnope'), self._relay_entry(dl='soon'), self._relay_entry(gas=-1)):
+            with self.subTest(request=entry['r']):
+                body = replay._relay_body(entry)
+                self.assertIsNone(body['signature'])
+                self.assertEqual(body['request']['to'], entry['r']['to'])
+
+    def test_report_counts_only_server_errors(self):
+        entries = [{'e': 'relay', 'ms': 5}, {'e': 'relay', 'ms': 7}, {'e': 'relay', 'ms': 9}, {'e': 'nonce', 'ms': 1}]
+        results = [('relay', 200, 0.010, 0), ('relay', 400, 0.020, 0), ('relay', 0, 0.030, 0.002),
+                   ('nonce', 502, 0.001, 0)]
+        report = _report(entries, results, duration=2, label='build')
+        self.assertEqual((report['label'], report['requests'], report['throughput']), ('build', 4, 2.0))
+        self.assertEqual(report['lagP99'], 2.0)
+        relay = report['endpoints']['relay']
+        self.assertEqual((relay['count'], relay['errors'], relay['p50'], relay['p99']), (3, 1, 20.0, 30.0))
+        self.assertEqual(relay['statuses'], {'200': 1, '400': 1, '0': 1})
+        self.assertEqual(relay['capturedP95'], 9)
+        self.assertEqual(report['endpoints']['nonce']['errors'], 1)
+        self.assertNotIn('status', report['endpoints'])
+
+
+class FakeNodeTests(SimpleTestCase):
+    def setUp(self):
+        self.node = FakeNode(chain_id=31337, block_time=0)
+        self.account = Account.create()
+
+    def _call(self, method: str, *params):
+        response = self.node.handle({'jsonrpc': '2.0', 'id': 1, 'method': method, 'params': list(params)})
+        self.assertNotIn('error', response)
+        return response['result']
+
+    def _send(self, nonce: int, data: bytes = b'') -> str:
+        signed = self.account.sign_transaction({
+            'chainId': 31337, 'nonce': nonce, 'to': TARGET, 'value': 0, 'gas': 200000,
+            'maxFeePerGas': 2 * 10 ** 9, 'maxPriorityFeePerGas': 10 ** 9, 'data': data,
+        })
+        return self._call('eth_sendRawTransaction', '0x' + bytes(signed.raw_transaction).hex())
+
+    def test_sent_transactions_are_mined(self):
+        self.assertEqual(self._call('eth_chainId'), hex(31337))
+        self.assertEqual(self._call('eth_getTransactionCount', self.account.address, 'pending'), '0x0')
+
+        tx_hash = self._send(4, b'\x00\x01')
+        self.assertEqual(self._call('eth_getTransactionCount', self.account.address, 'pending'), '0x5')
+        receipt = self._call('eth_getTransactionReceipt', tx_hash)
+        self.assertEqual((receipt['status'], receipt['gasUsed']), ('0x1', hex(21000 + 4 + 16 + 30000)))
+        self.assertEqual(self._call('eth_getTransactionByHash', tx_hash)['nonce'], '0x4')
+        self.assertIsNone(self._call('eth_getTransactionReceipt', _tx_hash(1)))
+
+    def test_pending_until_block_time(self):
+        self.node.block_time = 60
+        self.assertIsNone(self._call('eth_getTransactionReceipt', self._send(0)))
+
+    def test_counts_executed_forward_requests(self):
+        request = (SENDER, TARGET, 0, 100000, 0, 2 ** 40, b'')
+        data = EXECUTE_SELECTOR + encode(
+            ['(address,address,uint256,uint256,uint256,uint48,bytes)', 'bytes'], [request, b'\x11' * 65]
+        )
+        tx_hash = self._send(0, data)
+        call = {'to': TARGET, 'data': '0x' + (NONCES_SELECTOR + encode(['address'], [SENDER])).hex()}
+        self.assertEqual(int(self._call('eth_call', call, 'latest'), 16), 0)
+
+        # Counted once it is mined, however often the receipt is read
+        self._call('eth_getTransactionReceipt', tx_hash)
+        self._call('eth_getTransactionReceipt', tx_hash)
+        self.assertEqual(int(self._call('eth_call', call, 'latest'), 16), 1)
+
+    def test_errors_are_json_rpc_errors(self):
+        self.assertEqual(self.node.handle({'id': 7, 'method': 'eth_mine'})['error']['code'], -32601)
+        self.assertEqual(self.node.handle({'id': 7, 'method': 'eth_sendRawTransaction', 'params': ['0x00']})
+                         ['error']['code'], -32000)
+        batch = self.node.handle([{'id': 1, 'method': 'eth_chainId'}, {'id': 2, 'method': 'net_version'}])
+        self.assertEqual([response['result'] for response in batch], [hex(31337), '31337'])
@@ -1,9 +1,12 @@
 from django.urls import path
-from .views import HealthView, GetNonceView, RelayView, TransactionStatusView
+from .views import HealthView, GetNonceView, RelayView, TransactionStatusView, TransactionHistoryView, PolicyView, SpendReportView
 
 urlpatterns = [
     path('health', HealthView.as_view()),
     path('nonce', GetNonceView.as_view(), name='get_nonce'),
     path('relay/', RelayView.as_view(), name='relay'),
     path('status/<str:tx_hash>/', TransactionStatusView.as_view(), name='status'),
+    path('transactions/', TransactionHistoryView.as_view(), name='transactions'),
+    path('policy', PolicyView.as_view(), name='policy'),
+    path('spend', SpendReportView.as_view(), name='spend'),
 ]
\ No newline at end of file
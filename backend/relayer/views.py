@@ -1,13 +1,54 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.exceptions import ParseError
 from .services import RelayerService
-from .models import RelayedTransaction
+from .forward_request import ForwardRequest, InvalidForwardRequest, parse_signature
+from .models import Calldata, RelayedTransaction
+from .admission import admission
+from .cache import cached_response, status_cache
+from .capture import captured
+from .ledger import spend_ledger
+from .pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, keyset_page, parse_timestamp
+from .parsers import FastJSONParser, FastJSONRenderer
+from .persistence import write_buffer
+from .dispatcher import QueueDispatcher
+from .policy import policy_store
+from .receipts import ReceiptWatcher
+from .scheduler import JobCancelled, QueueFull, RelayScheduler, RequestExpired
+from concurrent.futures import CancelledError, TimeoutError as FutureTimeout
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Max, Q
+from django.utils import timezone
+from web3 import Web3
+from web3.exceptions import TransactionNotFound
+import secrets
 import time
 
 relayer_service = RelayerService()
+# Settles this node's own transactions; see receipts.ReceiptWatcher
+receipt_watcher = ReceiptWatcher.from_settings(relayer_service.w3, relayer_service.key_leases.held)
+scheduler_wait_timeout = getattr(settings, 'RELAYER_SCHEDULER', {}).get('WAIT_TIMEOUT', 30)
+# Jobs are dispatched only once one of our leased keys has admission room
+scheduler = RelayScheduler.from_settings(
+    latency=admission.latency,
+    acquire=lambda share: admission.acquire_any(relayer_service.key_leases.held(), share)[0],
+    release=admission.release,
+)
+
+# With hand-off enabled, relays this node can't send in time go to the
+# shared queue, and this node sends other nodes' relays when it has room
+cluster_handoff = getattr(settings, 'RELAYER_CLUSTER', {}).get('HANDOFF', False)
+# Handed-off relays have no tier; they get the lowest tier's share of admission
+dispatcher = QueueDispatcher.from_settings(
+    relayer_service, receipt_watcher, share=scheduler.shares[scheduler.tiers[-1]]
+)
+if cluster_handoff:
+    dispatcher.start()
 
 class GetNonceView(APIView):
+    @captured('nonce')
     def get(self, request):
         address = request.query_params.get('address')
         if not address:
@@ -17,8 +58,32 @@ class GetNonceView(APIView):
             )
         
         try:
-            nonce = relayer_service.get_nonce(address)
+            address = Web3.to_checksum_address(address)
+            # Relays still in flight on any node have taken nonces the
+            # forwarder hasn't seen yet. Only those that can still execute
+            # count: past their deadline, or sent longer ago than the receipt
+            # watcher waits, they never will, and the sender must not be
+            # stuck behind them
+            broadcast_since = timezone.now() - timedelta(seconds=receipt_watcher.timeout)
+            pending = (
+                RelayedTransaction.objects
+                .filter(from_address=address)
+                .filter(Q(status__in=RelayedTransaction.UNSENT_STATUSES) | Q(created_at__gte=broadcast_since))
+                .exclude(status__in=RelayedTransaction.FINAL_STATUSES)
+                .exclude(deadline__lt=int(time.time()))
+                .aggregate(highest=Max('nonce'))['highest']
+            )
+            nonce = max(
+                relayer_service.get_nonce(address),
+                pending + 1 if pending is not None else 0,
+                write_buffer.next_nonce(address) or 0,
+            )
             return Response({'nonce': nonce})
+        except ValueError as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         except Exception as e:
             return Response(
                 {'error': str(e)},
@@ -27,6 +92,10 @@ class GetNonceView(APIView):
 
 
 class RelayView(APIView):
+    parser_classes = [FastJSONParser]
+    renderer_classes = [FastJSONRenderer]
+
+    @captured('relay')
     def post(self, request):
         """
         Expected payload:
@@ -44,14 +113,41 @@ class RelayView(APIView):
         }
         """
         try:
-            forward_request = request.data.get('request')
-            signature = request.data.get('signature')
-            
-            if not forward_request or not signature:
+            payload = request.data
+            if not isinstance(payload, dict) or not payload.get('request') or not payload.get('signature'):
                 return Response(
                     {'error': 'Missing request or signature'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
+            forward_request = ForwardRequest.parse(payload['request'])
+            signature = parse_signature(payload['signature'])
+        except (ParseError, InvalidForwardRequest) as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            # Cheap checks first: nothing below this needs any cryptography
+            # until verify_signature
+            if forward_request.expired(time.time()):
+                return Response(
+                    {'error': 'Request expired'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            decision = policy_store.evaluate(forward_request)
+            if not decision.allowed:
+                return Response(
+                    {'error': 'Request not sponsored', 'rule': decision.rule_id},
+                    status=status.HTTP_403_FORBIDDEN
+                )
+            budget = policy_store.policy.budgets.get(decision.sponsor)
+            if not spend_ledger.within_budget(decision.sponsor, budget):
+                return Response(
+                    {'error': 'Sponsor budget exhausted', 'sponsor': decision.sponsor},
+                    status=status.HTTP_402_PAYMENT_REQUIRED
+                )
             
             # Verify signature
             if not relayer_service.verify_signature(forward_request, signature):
@@ -60,32 +156,35 @@ class RelayView(APIView):
                     status=status.HTTP_401_UNAUTHORIZED
                 )
             
-            # Check deadline
-            if int(forward_request['deadline']) < int(time.time()):
-                return Response(
-                    {'error': 'Request expired'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            # Relay transaction
-            tx_hash = relayer_service.relay_transaction(forward_request, signature)
-            
-            # Save to database
-            RelayedTransaction.objects.create(
-                request_id=tx_hash,
-                from_address=forward_request['from'],
-                to_address=forward_request['to'],
-                data=forward_request['data'],
-                nonce=forward_request['nonce'],
-                tx_hash=tx_hash,
-                status='submitted'
+            # Queue for a dispatch worker of the sponsor's tier
+            job = scheduler.submit(
+                decision.tier,
+                forward_request.deadline,
+                lambda job, relayer: _send(job, relayer, forward_request, signature, decision.sponsor)
             )
+            try:
+                tx_hash = job.future.result(timeout=scheduler_wait_timeout)
+            except FutureTimeout:
+                # Still queued for admission. If it can't be withdrawn it
+                # is being sent right now, so wait for that.
+                job.cancel()
+                tx_hash = job.future.result()
             
             return Response({
                 'txHash': tx_hash,
                 'status': 'submitted'
             })
             
+        except RequestExpired as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except (QueueFull, JobCancelled, CancelledError):
+            if cluster_handoff:
+                # Let a node with spare capacity send it
+                return _hand_off(forward_request, signature, decision.sponsor)
+            return _busy_response(admission.retry_after(relayer_service.key_leases.held()))
         except Exception as e:
             return Response(
                 {'error': str(e)},
@@ -93,24 +192,106 @@ class RelayView(APIView):
             )
 
 
+def _send(job, relayer: str, forward_request: ForwardRequest, signature: bytes, sponsor: str) -> str:
+    """Runs on a scheduler worker holding an admission slot on `relayer`: broadcast, persist."""
+    try:
+        if job.cancelled.is_set():
+            raise JobCancelled()
+        sent = relayer_service.relay_transaction(forward_request, signature, relayer)
+    except Exception:
+        admission.release(relayer)
+        raise
+    admission.submitted(relayer, sent.tx_hash)
+    receipt_watcher.watch(sent.tx_hash, sponsor or forward_request.to.lower())
+
+    # Save to database (flushed in batches by the write-behind buffer)
+    write_buffer.add(
+        request_id=sent.tx_hash,
+        from_address=forward_request.sender,
+        to_address=forward_request.to,
+        calldata=Calldata.from_bytes(forward_request.data),
+        nonce=forward_request.nonce,
+        deadline=forward_request.deadline,
+        tx_hash=sent.tx_hash,
+        status='submitted',
+        sponsor=sponsor,
+        relayer=sent.relayer,
+        relayer_nonce=sent.nonce
+    )
+    return sent.tx_hash
+
+
+def _hand_off(forward_request: ForwardRequest, signature: bytes, sponsor: str) -> Response:
+    # Written straight away rather than through the write-behind buffer,
+    # since other nodes have to see it
+    calldata = Calldata.from_bytes(forward_request.data)
+    Calldata.objects.bulk_create([calldata], ignore_conflicts=True)
+    tx = RelayedTransaction.objects.create(
+        request_id='0x' + secrets.token_hex(32),
+        from_address=forward_request.sender,
+        to_address=forward_request.to,
+        calldata=calldata,
+        nonce=forward_request.nonce,
+        deadline=forward_request.deadline,
+        status='queued',
+        sponsor=sponsor,
+        payload={'request': forward_request.to_payload(), 'signature': '0x' + signature.hex()}
+    )
+    return Response(
+        {'requestId': tx.request_id, 'status': 'queued'},
+        status=status.HTTP_202_ACCEPTED
+    )
+
+
+def _busy_response(retry_after: int) -> Response:
+    response = Response(
+        {'error': 'Relayer busy, retry later', 'retryAfter': retry_after},
+        status=status.HTTP_429_TOO_MANY_REQUESTS
+    )
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
 class TransactionStatusView(APIView):
+    @captured('status')
     def get(self, request, tx_hash):
+        cached = status_cache.get(tx_hash)
+        if cached:
+            body, etag, final = cached
+            return cached_response(request, body, etag, final, status_cache.pending_ttl)
+
         try:
-            tx = RelayedTransaction.objects.get(tx_hash=tx_hash)
+            tx = write_buffer.get(tx_hash) or _lookup(tx_hash)
             
-            # Check on-chain status
-            receipt = relayer_service.w3.eth.get_transaction_receipt(tx_hash)
-            if receipt:
-                tx.status = 'success' if receipt['status'] == 1 else 'failed'
-                tx.save()
+            # Check on-chain status, unless we already know the outcome or
+            # it hasn't been sent yet. Dropped ones are checked too, since
+            # they may be mined after all
+            if (tx.status not in RelayedTransaction.SETTLED_STATUSES
+                    and tx.status not in RelayedTransaction.UNSENT_STATUSES):
+                try:
+                    receipt = relayer_service.w3.eth.get_transaction_receipt(tx.tx_hash)
+                except TransactionNotFound:
+                    # Still in the mempool
+                    receipt = None
+                if receipt:
+                    new_status = 'success' if receipt['status'] == 1 else 'failed'
+                    if new_status != tx.status:
+                        tx.status = new_status
+                        # Display only; the sending node bills it
+                        write_buffer.set_status(tx.tx_hash, new_status)
             
-            return Response({
+            body = {
                 'txHash': tx.tx_hash,
                 'status': tx.status,
                 'from': tx.from_address,
                 'to': tx.to_address,
                 'createdAt': tx.created_at
-            })
+            }
+            if tx.request_id != tx.tx_hash:
+                body['requestId'] = tx.request_id
+            final = tx.status in RelayedTransaction.SETTLED_STATUSES
+            etag = status_cache.set(tx_hash, body, final)
+            return cached_response(request, body, etag, final, status_cache.pending_ttl)
         except RelayedTransaction.DoesNotExist:
             return Response(
                 {'error': 'Transaction not found'},
@@ -122,6 +303,111 @@ class TransactionStatusView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+def _lookup(tx_hash: str) -> RelayedTransaction:
+    # Handed-off relays are looked up by the requestId they were given
+    # until they have a tx hash
+    try:
+        return RelayedTransaction.objects.get(tx_hash=tx_hash)
+    except RelayedTransaction.DoesNotExist:
+        return RelayedTransaction.objects.get(request_id=tx_hash)
+
+
+class TransactionHistoryView(APIView):
+    def get(self, request):
+        """
+        Query params (all optional):
+            from, to     - sender / target address
+            status       - submitted, success, failed, ...
+            since, until - unix timestamps bounding created_at
+            limit        - page size, default 50, max 200
+            cursor       - `nextCursor` from the previous page
+        """
+        params = request.query_params
+        try:
+            queryset = RelayedTransaction.objects.all()
+            if params.get('from'):
+                queryset = queryset.filter(from_address=Web3.to_checksum_address(params['from']))
+            if params.get('to'):
+                queryset = queryset.filter(to_address=Web3.to_checksum_address(params['to']))
+            if params.get('status'):
+                queryset = queryset.filter(status=params['status'])
+            if params.get('since'):
+                queryset = queryset.filter(created_at__gte=parse_timestamp(params['since']))
+            if params.get('until'):
+                queryset = queryset.filter(created_at__lt=parse_timestamp(params['until']))
+
+            limit = min(int(params.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+            if limit < 1:
+                raise ValueError("limit must be positive")
+
+            rows, next_cursor = keyset_page(queryset, params.get('cursor'), limit)
+        except ValueError as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response({
+            'results': [
+                {
+                    'txHash': row['tx_hash'],
+                    'status': row['status'],
+                    'from': row['from_address'],
+                    'to': row['to_address'],
+                    'nonce': row['nonce'],
+                    'createdAt': row['created_at'],
+                }
+                for row in rows
+            ],
+            'nextCursor': next_cursor,
+        })
+
+
+class SpendReportView(APIView):
+    def get(self, request):
+        """
+        Query params (all optional):
+            sponsor      - restrict to one sponsor
+            since, until - unix timestamps bounding the buckets
+        """
+        params = request.query_params
+        try:
+            since = parse_timestamp(params['since']) if params.get('since') else None
+            until = parse_timestamp(params['until']) if params.get('until') else None
+        except ValueError as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        sponsor = params.get('sponsor')
+        budgets = policy_store.policy.budgets
+        sponsors = [sponsor] if sponsor else list(budgets)
+        return Response({
+            'buckets': spend_ledger.report(sponsor, since, until),
+            'budgets': [
+                {
+                    'sponsor': name,
+                    'dailyBudgetWei': str(budgets[name]) if name in budgets else None,
+                    'spentTodayWei': str(spend_ledger.spent_today(name)),
+                }
+                for name in sponsors
+            ],
+        })
+
+
+class PolicyView(APIView):
+    def get(self, request):
+        return Response(policy_store.stats())
+
+
 class HealthView(APIView):
     def get(self, request):
-        return Response({"status": "ok", "time": time.time()})
+        return Response({
+            "status": "ok",
+            "time": time.time(),
+            "admission": admission.stats(),
+            "scheduler": scheduler.stats(),
+            "receipts": receipt_watcher.stats(),
+            "cluster": dict(relayer_service.key_leases.stats(), dispatched=dispatcher.stats()['sent']),
+        })